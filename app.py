@@ -6,10 +6,12 @@ from routes.books import books_bp
 from routes.upload import upload_bp
 from routes.extract import extract_bp
 from routes.ai import ai_bp
+from utils.file_serving import send_book_file
 from pathlib import Path
 import os
 import datetime
 import logging
+import multiprocessing
 import traceback
 
 # Ensure logs directory exists
@@ -27,6 +29,16 @@ def setup_logging(app):
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+
+    # PDF extraction pool processes are spawned, which re-imports the
+    # launching script and so builds an app too; only the server itself
+    # runs the job dispatcher and builds the UI assets
+    pool_process = multiprocessing.current_process().name != "MainProcess"
+
+    # Client IPs (for login rate limits) come from X-Forwarded-For behind a proxy
+    if Config.PROXY_HOPS:
+        from werkzeug.middleware.proxy_fix import ProxyFix
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.PROXY_HOPS)
     
     # Enable CORS (Allow everything for demo)
     from flask_cors import CORS
@@ -52,6 +64,15 @@ def create_app():
     app.register_blueprint(admin_bp, url_prefix="/api/admin")
     app.register_blueprint(payment_bp, url_prefix="/api/payment")
 
+    # gzip/brotli for sizeable JSON responses
+    from utils import http_cache
+    http_cache.init_app(app)
+
+    # Background worker for extraction jobs queued by uploads
+    from utils.jobs import start_worker
+    if not pool_process:
+        start_worker()
+
     @app.route("/api/health")
     def health():
         return jsonify({"status":"ok", "time": datetime.datetime.utcnow().isoformat()})
@@ -69,30 +90,48 @@ def create_app():
         app.logger.error("Unhandled exception:\n%s", tb)
         return jsonify({"error":"internal server error"}), 500
 
+    # Files stored in S3 are read from the bucket directly via a presigned URL
+    def s3_redirect(filename, content_type=None):
+        from utils import s3
+        if s3.ENABLED and not (Path(app.config['UPLOAD_FOLDER']) / filename).is_file():
+            from flask import redirect
+            return redirect(s3.presigned_get(filename, content_type=content_type))
+        return None
+
     # Serve local uploads (dev)
     @app.route("/uploads/<path:filename>")
     def uploaded_file(filename):
         upload_folder = app.config['UPLOAD_FOLDER']
-        return send_from_directory(upload_folder, filename, as_attachment=False)
+        return s3_redirect(filename) or send_book_file(upload_folder, filename)
     
     # Serve PDF files for PDF.js rendering
     @app.route("/pdf/<path:filename>")
     def serve_pdf(filename):
+        redirect_response = s3_redirect(filename, 'application/pdf')
+        if redirect_response:
+            return redirect_response
         upload_folder = app.config['UPLOAD_FOLDER']
-        response = send_from_directory(upload_folder, filename, mimetype='application/pdf', as_attachment=False)
+        response = send_book_file(upload_folder, filename, mimetype='application/pdf')
         response.headers['Access-Control-Allow-Origin'] = '*'
         return response
 
-    # Serve the lightweight interactive UI
+    # Serve the lightweight interactive UI: minified, fingerprinted and
+    # precompressed from static_ui/dist/ (see build_ui.py), or the sources as-is
+    from utils import ui_assets
     ui_dir = Path(__file__).parent / "static_ui"
+    try:
+        if not pool_process:
+            ui_assets.ensure_built()
+    except Exception:
+        app.logger.exception("UI asset build failed; serving static_ui/ unbuilt")
 
     @app.route('/ui')
     def ui_index():
-        return send_from_directory(str(ui_dir), 'index.html')
+        return ui_assets.serve() or send_from_directory(str(ui_dir), 'index.html')
 
     @app.route('/ui/<path:filename>')
     def ui_static(filename):
-        return send_from_directory(str(ui_dir), filename)
+        return ui_assets.serve(filename) or send_from_directory(str(ui_dir), filename)
 
     return app
 
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""Benchmark single-call vs process-pool PDF text extraction.
+
+Builds a synthetic text-only PDF and times extract_text_from_pdf_bytes
+against extract_text_parallel at several worker counts, checking that the
+output is identical.
+
+Run: python bench_pdf_extract.py [pages] [worker counts...]
+"""
+
+import os
+import sys
+import time
+
+from config import Config
+from utils.pdf_extract import extract_text_from_pdf_bytes, extract_text_parallel
+
+
+def make_pdf(pages, lines=45):
+    """Minimal multi-page PDF with Helvetica text lines."""
+    objs = [b"<< /Type /Catalog /Pages 2 0 R >>",
+            ("<< /Type /Pages /Kids [" + " ".join(f"{4 + 2 * i} 0 R" for i in range(pages))
+             + f"] /Count {pages} >>").encode(),
+            b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    for p in range(pages):
+        text = "BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(
+            f"(Page {p + 1} line {l}: it was the best of times, it was the worst of times) '"
+            for l in range(lines)) + " ET"
+        stream = text.encode()
+        objs.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                    f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * p} 0 R >>".encode())
+        objs.append(b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, obj in enumerate(objs):
+        offsets.append(len(out))
+        out += f"{i + 1} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objs) + 1}\n0000000000 65535 f \n".encode()
+    for off in offsets:
+        out += f"{off:010d} 00000 n \n".encode()
+    out += f"trailer\n<< /Size {len(objs) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    counts = [int(a) for a in sys.argv[2:]] or sorted({2, 4, os.cpu_count() or 1})
+    pdf = make_pdf(pages)
+    print(f"Synthetic PDF: {pages} pages, {len(pdf) // 1024} KiB, {os.cpu_count()} CPUs\n")
+
+    baseline, base_time = timed(extract_text_from_pdf_bytes, pdf)
+    print(f"  single call      {base_time:7.2f}s")
+    for workers in counts:
+        # Start the worker processes outside the timed run
+        extract_text_parallel(make_pdf(Config.PDF_PARALLEL_MIN_PAGES), workers)
+        text, elapsed = timed(extract_text_parallel, pdf, workers)
+        same = "identical" if text == baseline else "MISMATCH"
+        print(f"  {workers:2d} processes     {elapsed:7.2f}s  x{base_time / elapsed:4.1f}  {same}")
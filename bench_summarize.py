@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Benchmark simple_summarize against the previous multi-pass implementation.
+
+Generates synthetic book-length texts, times both versions and checks that
+summary, keywords and categories are identical.
+
+Run: python bench_summarize.py [words...]
+"""
+
+import random
+import sys
+import time
+
+from routes.ai import simple_summarize
+
+
+# Previous implementation, kept verbatim as the reference
+def legacy_summarize(text, num_sentences=5):
+    import re, math
+    clean = re.sub(r'\s+', ' ', text).strip()
+    sentences = re.split(r'(?<=[.!?])\s+', clean)
+    words = re.findall(r'\w+', clean.lower())
+    stopwords = set(["the","and","for","that","with","this","from","are","was","were","have","has","not","but","you","your","they","their","will","would","can","could","about","into","than","them","then"])
+    freq = {}
+    for w in words:
+        if w in stopwords or len(w)<3: continue
+        freq[w] = freq.get(w,0)+1
+    if freq:
+        maxf = max(freq.values())
+        for k in freq: freq[k]=freq[k]/maxf
+    scored = []
+    for s in sentences:
+        s_words = re.findall(r'\w+', s.lower())
+        score = sum(freq.get(w,0) for w in s_words)
+        scored.append((score,s))
+    ranked = sorted(range(len(scored)), key=lambda i: scored[i][0], reverse=True)
+    top = sorted(ranked[:num_sentences])
+    summary = " ".join(sentences[i] for i in top)
+    keywords = sorted(freq.items(), key=lambda kv: kv[1], reverse=True)[:5]
+    kw = [k for k,v in keywords]
+    
+    # Simple category detection based on keywords
+    categories = []
+    category_keywords = {
+        "Fiction": ["story", "character", "novel", "tale", "narrative"],
+        "Romance": ["love", "heart", "romance", "relationship", "passion"],
+        "Mystery": ["mystery", "detective", "crime", "murder", "investigation"],
+        "Fantasy": ["magic", "wizard", "dragon", "fantasy", "quest"],
+        "Science Fiction": ["space", "future", "technology", "robot", "alien"],
+        "Horror": ["horror", "fear", "terror", "ghost", "dark"],
+        "Adventure": ["adventure", "journey", "travel", "explore", "quest"],
+        "Classic": ["classic", "literature", "society", "tradition"],
+        "Historical": ["history", "war", "historical", "century", "past"],
+        "Biography": ["life", "biography", "memoir", "born", "lived"]
+    }
+    
+    text_lower = text.lower()
+    for category, keywords_list in category_keywords.items():
+        if any(keyword in text_lower for keyword in keywords_list):
+            categories.append(category)
+            if len(categories) >= 3:  # Limit to 3 categories
+                break
+    
+    if not categories:
+        categories = ["General"]
+    
+    return summary, kw, categories
+
+
+def make_text(words, seed=0):
+    """Zipf-ish prose with sentence breaks, line wraps and a few odd characters."""
+    rng = random.Random(seed)
+    vocab = [f"w{i}x" for i in range(20000)] + ["the", "and", "story", "awarded", "pasta", "heart", "İstanbul", "ΟΔΟΣ", "naïve", "état"]
+    weights = [1 / (i + 1) for i in range(len(vocab))]
+    out, n = [], 0
+    while n < words:
+        length = rng.randint(4, 30)
+        sentence = rng.choices(vocab, weights, k=length)
+        sentence[0] = sentence[0].capitalize()
+        out.append(" ".join(sentence) + rng.choice([".", ".", ".", "!", "?", ","]))
+        out.append(rng.choice([" ", " ", "  ", "\n", "\t\n"]))
+        n += length
+    return "".join(out)
+
+
+def timed(fn, text):
+    start = time.perf_counter()
+    result = fn(text, num_sentences=6)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    sizes = [int(a) for a in sys.argv[1:]] or [10_000, 100_000, 500_000]
+    for words in sizes:
+        text = make_text(words)
+        old, old_time = timed(legacy_summarize, text)
+        new, new_time = timed(simple_summarize, text)
+        same = "identical" if old == new else "MISMATCH"
+        print(f"{words:>8} words  legacy {old_time:6.2f}s  single-pass {new_time:6.2f}s  x{old_time / new_time:4.1f}  {same}")
@@ -0,0 +1,22 @@
+"""Build the static UI into static_ui/dist/ (minified, fingerprinted, precompressed).
+
+The app also builds on startup when the sources changed; run this as part of
+the deploy build step so the first request doesn't pay for it:
+
+    python build_ui.py
+"""
+
+from utils import ui_assets
+
+
+def main():
+    manifest = ui_assets.build()
+    for name, info in sorted(manifest["files"].items()):
+        sizes = ", ".join(f"{encoding} {size:,}" for encoding, size in info["sizes"].items())
+        print(f"{name:40} {sizes}")
+    if ui_assets.brotli is None:
+        print("brotli not installed: gzip variants only")
+
+
+if __name__ == "__main__":
+    main()
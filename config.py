@@ -13,3 +13,78 @@ class Config:
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     PORT = int(os.getenv("PORT", 5000))
     UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), "static_uploads")
+    # Storage backend for data_store: "sqlite" (default) or the legacy "json" files
+    DATA_BACKEND = os.getenv("DATA_BACKEND", "sqlite")
+    DATA_DB = os.getenv("DATA_DB", os.path.join(os.path.dirname(__file__), "data", "elibrary.db"))
+    # JSON backend: fold data/<name>.journal into the base file past this size
+    JOURNAL_COMPACT_BYTES = int(os.getenv("JOURNAL_COMPACT_BYTES", 1024 * 1024))
+    # Extracted PDF text cache (utils/text_cache.py), evicted LRU past the size cap
+    TEXT_CACHE_DIR = os.getenv("TEXT_CACHE_DIR", os.path.join(os.path.dirname(__file__), "data", "text_cache"))
+    TEXT_CACHE_MAX_BYTES = int(os.getenv("TEXT_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+    # S3: presigned URL lifetime and the shared client's connection pool
+    S3_PRESIGN_SECONDS = int(os.getenv("S3_PRESIGN_SECONDS", 900))
+    S3_MAX_CONNECTIONS = int(os.getenv("S3_MAX_CONNECTIONS", 20))
+    # Uploads: part size for S3 multipart and resumable sessions, parallel S3
+    # part uploads, how long an unfinished resumable upload is kept, and after
+    # how long a completion that never finished (its worker died) is released
+    UPLOAD_PART_BYTES = int(os.getenv("UPLOAD_PART_BYTES", 8 * 1024 * 1024))
+    UPLOAD_S3_CONCURRENCY = int(os.getenv("UPLOAD_S3_CONCURRENCY", 4))
+    UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", 24 * 3600))
+    UPLOAD_COMPLETE_TIMEOUT = int(os.getenv("UPLOAD_COMPLETE_TIMEOUT", 600))
+    # Remote book files (utils/remote.py): size cap, in-memory spool limit,
+    # timeouts and the on-disk conditional-GET cache
+    REMOTE_MAX_BYTES = int(os.getenv("REMOTE_MAX_BYTES", 100 * 1024 * 1024))
+    REMOTE_SPOOL_BYTES = int(os.getenv("REMOTE_SPOOL_BYTES", 8 * 1024 * 1024))
+    REMOTE_CONNECT_TIMEOUT = float(os.getenv("REMOTE_CONNECT_TIMEOUT", 5))
+    REMOTE_READ_TIMEOUT = float(os.getenv("REMOTE_READ_TIMEOUT", 30))
+    REMOTE_CACHE_DIR = os.getenv("REMOTE_CACHE_DIR", os.path.join(os.path.dirname(__file__), "data", "remote_cache"))
+    REMOTE_CACHE_MAX_BYTES = int(os.getenv("REMOTE_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+    # Memoized /api/ai/summarize results (utils/summary_cache.py)
+    SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", 30 * 24 * 3600))
+    SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", 5000))
+    # Gemini client: model ("stub" = offline fake), concurrent calls, per-call
+    # timeout, retries and the overall budget of one summarize request, which
+    # must stay under gunicorn's 120s timeout
+    GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash-exp")
+    GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", 4))
+    GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", 30))
+    GEMINI_RETRIES = int(os.getenv("GEMINI_RETRIES", 3))
+    GEMINI_DEADLINE_SECONDS = float(os.getenv("GEMINI_DEADLINE_SECONDS", 90))
+    # Map-reduce LLM summarization: section size and concurrent section calls
+    SUMMARY_CHUNK_CHARS = int(os.getenv("SUMMARY_CHUNK_CHARS", 30000))
+    SUMMARY_WORKERS = int(os.getenv("SUMMARY_WORKERS", 4))
+    # Parallel PDF extraction: worker processes (0 = one per CPU, 1 = off) and
+    # the smallest document worth splitting across them
+    PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", 0))
+    PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", 32))
+    # Background extraction jobs queued at upload time (utils/jobs.py)
+    EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", 1))
+    JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", 2))
+    # A running job's worker refreshes its heartbeat this often; one silent for
+    # JOB_STALE_SECONDS is requeued. Finished jobs are deleted after JOB_RETENTION_SECONDS
+    JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", 30))
+    JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", 600))
+    JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", 7 * 24 * 3600))
+    # JSON responses at least this large are gzip/brotli compressed (utils/http_cache.py)
+    COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+    COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", 6))
+    # Idempotency-Key responses are replayed for this long; a retry waits at
+    # most IDEMPOTENCY_LOCK_SECONDS for the attempt still running (utils/idempotency.py)
+    IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", 24 * 3600))
+    IDEMPOTENCY_LOCK_SECONDS = float(os.getenv("IDEMPOTENCY_LOCK_SECONDS", 10))
+    # Password hashing (utils/passwords.py): bcrypt cost for new hashes (older
+    # ones are rehashed at login), hashing threads per worker, requests that may
+    # wait for one before logins get 429, and how long a wrong password is remembered
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+    BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", 1))
+    BCRYPT_QUEUE = int(os.getenv("BCRYPT_QUEUE", 2))
+    NEGATIVE_CACHE_SECONDS = int(os.getenv("NEGATIVE_CACHE_SECONDS", 300))
+    # Login/signup attempts per client IP, and failed logins per client IP and
+    # email, within a window of seconds; counted per gunicorn worker (utils/rate_limit.py)
+    LOGIN_RATE_PER_IP = int(os.getenv("LOGIN_RATE_PER_IP", 30))
+    LOGIN_RATE_WINDOW = int(os.getenv("LOGIN_RATE_WINDOW", 60))
+    LOGIN_FAILURES_PER_EMAIL = int(os.getenv("LOGIN_FAILURES_PER_EMAIL", 5))
+    LOGIN_FAILURE_WINDOW = int(os.getenv("LOGIN_FAILURE_WINDOW", 15 * 60))
+    # Reverse proxies in front of the app whose X-Forwarded-For is trusted for
+    # the client IP (1 on Render/Heroku, 0 when clients connect directly)
+    PROXY_HOPS = int(os.getenv("PROXY_HOPS", 0))
@@ -1,25 +1,957 @@
+import bisect
+import contextlib
 import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import uuid
 from pathlib import Path
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows: JSON backend falls back to in-process locking
+    fcntl = None
 
 BASE = Path(__file__).parent
 USERS = BASE / "data" / "users.json"
 BOOKS = BASE / "data" / "books.json"
 PURCHASES = BASE / "data" / "purchases.json"
 PAYMENTS = BASE / "data" / "payments.json"
+JOBS = BASE / "data" / "jobs.json"
+SUMMARIES = BASE / "data" / "summaries.json"
+UPLOADS = BASE / "data" / "uploads.json"
+ANALYTICS = BASE / "data" / "analytics.json"
+IDEMPOTENCY = BASE / "data" / "idempotency.json"
+COLLECTIONS = (USERS, BOOKS, PURCHASES, PAYMENTS, JOBS, SUMMARIES, UPLOADS, ANALYTICS, IDEMPOTENCY)
+
+# Fields each collection is commonly looked up by. The SQLite backend builds an
+# expression index for every entry; "lower" marks case-insensitive fields.
+SECONDARY_INDEXES = {
+    "users": {"email": "lower", "isAdmin": None},
+    "books": {"filename": None},
+    "purchases": {"userId": None},
+    "payments": {"userId": None, "bookId": None, "status": None, "method": None},
+    "jobs": {"status": None, "filename": None, "finishedAt": None},
+    "summaries": {"contentKey": None, "createdAt": None},
+    "uploads": {"status": None},
+    "idempotency": {"createdAt": None},
+}
+
+# Per-group record counts and sums kept current by the store, as (group
+# field, summed field or None, (filter field, value) or None). The SQLite
+# backend maintains each in a trigger-updated table, indexed by count and by
+# sum; see group_totals() and page_totals().
+GROUPED_TOTALS = {
+    "purchases": [("userId", None, None)],
+    "payments": [("userId", "amount", ("status", "success"))],
+}
+
+
+def _name(file):
+    return Path(file).stem
+
+
+def _normalize(collection, field, value):
+    if SECONDARY_INDEXES.get(collection, {}).get(field) == "lower" and isinstance(value, str):
+        return value.lower()
+    return value
+
+
+def atomic_write(path, text):
+    """Write via a temp file in the same directory, fsync, then rename over."""
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as fh:
+            fh.write(text)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+
+
+class JsonBackend:
+    """JSON storage: data/<name>.json plus an append-only data/<name>.journal.
+
+    Writes append one line to the journal (fsynced) instead of rewriting the
+    whole file; reads replay the journal over the base file, and a background
+    thread folds the journal back into the base once it passes
+    JOURNAL_COMPACT_BYTES. Replay is idempotent, so a crash between writing
+    the new base and truncating the journal loses nothing. Every access holds
+    a per-collection lock: a thread lock plus flock on data/<name>.lock, which
+    keeps gunicorn workers from interleaving (flock is unavailable on Windows,
+    where only the thread lock applies).
+
+    Lookups are answered from the facade's in-memory snapshot (``indexed`` is
+    False), so the backend only needs to load and store whole collections.
+    """
+
+    indexed = False
+
+    def __init__(self):
+        self._ensured = False
+        self._locks = {name: threading.Lock() for name in map(_name, COLLECTIONS)}
+        self._lock_fds = {}
+        self._state = {}  # name -> (base stat, journal offset, {id: record})
+        self._compacting = set()
+
+    def ensure(self):
+        BASE.joinpath("data").mkdir(exist_ok=True)
+        for f in COLLECTIONS:
+            if not f.exists():
+                f.write_text("[]")
+        self._ensured = True
+
+    @staticmethod
+    def _journal(file):
+        return Path(file).with_suffix(".journal")
+
+    @contextlib.contextmanager
+    def _locked(self, file, exclusive=True):
+        name = _name(file)
+        with self._locks[name]:
+            if fcntl is None:
+                yield
+                return
+            key = (name, os.getpid())
+            fd = self._lock_fds.get(key)
+            if fd is None:
+                fd = self._lock_fds[key] = os.open(Path(file).with_suffix(".lock"), os.O_RDWR | os.O_CREAT)
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _stat(self, file):
+        try:
+            st = Path(file).stat()
+        except FileNotFoundError:
+            self.ensure()
+            st = Path(file).stat()
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _journal_size(self, file):
+        try:
+            return self._journal(file).stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def generation(self, file):
+        # File identity of the base plus the journal length: any write, from
+        # this process or another worker, changes one of them.
+        return (self._stat(file), self._journal_size(file))
+
+    def instance(self):
+        # Generations already include file identities
+        return "json"
+
+    def _load(self, file):
+        """Current {id: record} state; only replays journal bytes not seen yet."""
+        name = _name(file)
+        base = self._stat(file)
+        state = self._state.get(name)
+        if state is None or state[0] != base or self._journal_size(file) < state[1]:
+            records = {}
+            for r in json.loads(Path(file).read_text()):
+                records[r.setdefault("id", str(uuid.uuid4()))] = r
+            offset = 0
+        else:
+            _, offset, records = state
+        journal = self._journal(file)
+        if journal.exists():
+            with open(journal, "rb") as fh:
+                fh.seek(offset)
+                chunk = fh.read()
+            # A torn final line (crash mid-append) has no newline; skip it.
+            complete = chunk[:chunk.rfind(b"\n") + 1]
+            for line in complete.splitlines():
+                self._apply(records, json.loads(line))
+            offset += len(complete)
+        self._state[name] = (base, offset, records)
+        return records
+
+    @staticmethod
+    def _apply(records, entry):
+        if entry["op"] == "put":
+            records[entry["record"]["id"]] = entry["record"]
+        elif entry["op"] == "del":
+            for id in entry.get("ids") or [entry["id"]]:
+                records.pop(id, None)
+
+    def _append(self, file, entry):
+        line = (json.dumps(entry) + "\n").encode()
+        name = _name(file)
+        base, offset, records = self._state[name]
+        with open(self._journal(file), "ab") as fh:
+            if fh.tell() > offset:
+                fh.truncate(offset)  # drop a torn line left by a crashed writer
+            fh.write(line)
+            fh.flush()
+            os.fsync(fh.fileno())
+        self._apply(records, entry)
+        self._state[name] = (base, offset + len(line), records)
+        if offset + len(line) > Config.JOURNAL_COMPACT_BYTES:
+            self._schedule_compaction(file)
+
+    def _schedule_compaction(self, file):
+        name = _name(file)
+        if name in self._compacting:
+            return
+        self._compacting.add(name)
+        def run():
+            try:
+                self.compact(file)
+            except Exception as e:
+                print(f"Journal compaction failed for {name}: {e}")
+            finally:
+                self._compacting.discard(name)
+        threading.Thread(target=run, name=f"compact-{name}", daemon=True).start()
+
+    def compact(self, file):
+        """Fold the journal into the base file and truncate it."""
+        with self._locked(file):
+            records = self._load(file)
+            atomic_write(file, json.dumps(list(records.values()), indent=2))
+            open(self._journal(file), "wb").close()
+            self._state[_name(file)] = (self._stat(file), 0, records)
+
+    def read(self, file):
+        if not self._ensured:
+            self.ensure()
+        with self._locked(file, exclusive=False):
+            return [dict(r) for r in self._load(file).values()]
+
+    def write(self, file, data):
+        if not self._ensured:
+            self.ensure()
+        with self._locked(file):
+            atomic_write(file, json.dumps(data, indent=2))
+            open(self._journal(file), "wb").close()
+            self._state.pop(_name(file), None)
+
+    # Mutators return (result, generation_before, generation_after).
+    def insert(self, file, record):
+        record.setdefault("id", str(uuid.uuid4()))
+        with self._locked(file):
+            before = self.generation(file)
+            self._load(file)
+            self._append(file, {"op": "put", "record": dict(record)})
+            return record, before, self.generation(file)
+
+    def update(self, file, id, changes):
+        with self._locked(file):
+            before = self.generation(file)
+            current = self._load(file).get(id)
+            if current is None:
+                return None, before, before
+            if callable(changes):
+                changes = changes(dict(current))
+                if changes is None:
+                    return dict(current), before, before
+            record = {**current, **changes}
+            self._append(file, {"op": "put", "record": record})
+            return dict(record), before, self.generation(file)
+
+    def delete(self, file, id):
+        with self._locked(file):
+            before = self.generation(file)
+            current = self._load(file).get(id)
+            if current is None:
+                return None, before, before
+            self._append(file, {"op": "del", "id": id})
+            return current, before, self.generation(file)
+
+    def prune(self, file, field, cutoff=None, keep=None):
+        with self._locked(file):
+            before = self.generation(file)
+            records = self._load(file)
+            doomed = []
+            if cutoff is not None:
+                doomed = [id for id, r in records.items() if isinstance(r.get(field), str) and r[field] < cutoff]
+            if keep is not None and len(records) - len(doomed) > keep:
+                gone = set(doomed)
+                rest = sorted((sort_key(r.get(field)), id) for id, r in records.items() if id not in gone)
+                doomed += [id for _, id in rest[:len(rest) - keep]]
+            if not doomed:
+                return [], before, before
+            self._append(file, {"op": "del", "ids": doomed})
+            return doomed, before, self.generation(file)
+
+
+class SqliteBackend:
+    """Embedded SQLite store: one table per collection keyed by record id.
+
+    Records are kept as JSON documents; ``seq`` preserves insertion order so
+    full reads come back in the same order the JSON files had. Single-record
+    operations touch one row through the primary key (or an expression index
+    from SECONDARY_INDEXES) instead of rewriting the whole collection. Writes
+    run in BEGIN IMMEDIATE transactions on a WAL database, so they are atomic
+    and serialized across gunicorn workers.
+    """
+
+    indexed = True
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._local = threading.local()
+        self._schema_pid = None
+        self._schema_lock = threading.Lock()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            with self._schema_lock:
+                if self._schema_pid != os.getpid():
+                    self._create_schema(conn)
+                    self._schema_pid = os.getpid()
+        return conn
+
+    def _create_schema(self, conn):
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        conn.execute("CREATE TABLE IF NOT EXISTS generations (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        for file in COLLECTIONS:
+            name = _name(file)
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {name} ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE, body TEXT NOT NULL)")
+            for field in SECONDARY_INDEXES.get(name, {}):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {name}_{field}_idx ON {name} ({self._expr(name, field)})")
+            # Every row change bumps the collection's generation, whichever
+            # process made it, so readers can tell when their copy is stale.
+            conn.execute("INSERT OR IGNORE INTO generations (name, value) VALUES (?, 0)", (name,))
+            for op in ("INSERT", "UPDATE", "DELETE"):
+                conn.execute(
+                    f"CREATE TRIGGER IF NOT EXISTS {name}_{op.lower()}_gen AFTER {op} ON {name} "
+                    f"BEGIN UPDATE generations SET value = value + 1 WHERE name = '{name}'; END")
+            for spec in GROUPED_TOTALS.get(name, []):
+                self._create_totals(conn, name, spec)
+        # Generations restart from 0 in a new database; this tells databases apart
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('instance', ?)", (uuid.uuid4().hex,))
+        migrate_from_json(self, conn)
+
+    def _create_totals(self, conn, name, spec):
+        """Table of (group key, records, sum) for one GROUPED_TOTALS entry, plus its triggers."""
+        table = self._totals_table(name, spec)
+        field, amount, where = spec
+
+        def parts(row):
+            key = self._expr(name, field, row)
+            value = (f"CASE WHEN json_type({row}, '$.{amount}') IN ('integer', 'real') "
+                     f"THEN json_extract({row}, '$.{amount}') ELSE 0 END") if amount else "0"
+            cond = f"{key} IS NOT NULL"
+            if where is not None:
+                literal = json.dumps(_normalize(name, *where)).replace("'", "''")
+                cond += f" AND {self._expr(name, where[0], row)} = json_extract('{literal}', '$')"
+            return key, value, cond
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone() is None:
+                conn.execute(f"CREATE TABLE {table} (key PRIMARY KEY, records INTEGER NOT NULL, total NOT NULL)")
+                key, value, cond = parts("body")
+                conn.execute(f"INSERT INTO {table} SELECT {key}, COUNT(*), SUM({value}) FROM {name} WHERE {cond} GROUP BY 1")
+            for column in ("records", "total"):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_{column}_idx ON {table} ({column}, key)")
+            key, value, cond = parts("NEW.body")
+            add = (f"INSERT INTO {table} (key, records, total) VALUES ({key}, 1, {value}) "
+                   "ON CONFLICT(key) DO UPDATE SET records = records + 1, total = total + excluded.total;")
+            old_key, old_value, old_cond = parts("OLD.body")
+            subtract = (f"UPDATE {table} SET records = records - 1, total = total - {old_value} WHERE key = {old_key}; "
+                        f"DELETE FROM {table} WHERE key = {old_key} AND records = 0;")
+            for trigger, op, when, body in (("insert", "INSERT", cond, add), ("delete", "DELETE", old_cond, subtract),
+                                            ("update_old", "UPDATE", old_cond, subtract), ("update_new", "UPDATE", cond, add)):
+                conn.execute(f"CREATE TRIGGER IF NOT EXISTS {table}_{trigger} AFTER {op} ON {name} WHEN {when} BEGIN {body} END")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _totals_table(name, spec):
+        return f"{name}_totals_{GROUPED_TOTALS[name].index(spec)}"
+
+    @staticmethod
+    def _expr(collection, field, row="body"):
+        expr = f"json_extract({row}, '$.{field}')"
+        if SECONDARY_INDEXES.get(collection, {}).get(field) == "lower":
+            expr = f"lower({expr})"
+        return expr
+
+    def generation(self, file, conn=None):
+        conn = conn or self._conn()
+        return conn.execute("SELECT value FROM generations WHERE name=?", (_name(file),)).fetchone()[0]
+
+    def instance(self):
+        return self._conn().execute("SELECT value FROM meta WHERE key='instance'").fetchone()[0]
+
+    def read(self, file):
+        rows = self._conn().execute(f"SELECT body FROM {_name(file)} ORDER BY seq").fetchall()
+        return [json.loads(body) for (body,) in rows]
+
+    def write(self, file, data):
+        """Replace the whole collection, touching only rows that changed."""
+        name = _name(file)
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._replace(conn, name, data)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _replace(self, conn, name, data):
+        existing = dict(conn.execute(f"SELECT id, body FROM {name}").fetchall())
+        keep = set()
+        for record in data:
+            record.setdefault("id", str(uuid.uuid4()))
+            body = json.dumps(record)
+            keep.add(record["id"])
+            if existing.get(record["id"]) == body:
+                continue
+            if record["id"] in existing:
+                conn.execute(f"UPDATE {name} SET body=? WHERE id=?", (body, record["id"]))
+            else:
+                conn.execute(f"INSERT INTO {name} (id, body) VALUES (?, ?)", (record["id"], body))
+        stale = [(id,) for id in existing if id not in keep]
+        conn.executemany(f"DELETE FROM {name} WHERE id=?", stale)
+
+    def get(self, file, id):
+        row = self._conn().execute(f"SELECT body FROM {_name(file)} WHERE id=?", (id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, file, field, value):
+        name = _name(file)
+        rows = self._conn().execute(
+            f"SELECT body FROM {name} WHERE {self._expr(name, field)}=? ORDER BY seq",
+            (_normalize(name, field, value),)).fetchall()
+        return [json.loads(body) for (body,) in rows]
+
+    def count(self, file, field=None, value=None):
+        name = _name(file)
+        if field is None:
+            return self._conn().execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+        return self._conn().execute(f"SELECT COUNT(*) FROM {name} WHERE {self._expr(name, field)}=?",
+                                    (_normalize(name, field, value),)).fetchone()[0]
+
+    def group_totals(self, file, field, amount=None, where=None, keys=None):
+        name = _name(file)
+        spec = (field, amount, where)
+        only = f" IN ({', '.join('?' * len(keys))})" if keys is not None else ""
+        if spec in GROUPED_TOTALS.get(name, []):
+            sql = f"SELECT key, records, total FROM {self._totals_table(name, spec)}"
+            rows = self._conn().execute(sql + (f" WHERE key{only}" if only else ""), tuple(keys or ())).fetchall()
+        else:
+            total = f"total(json_extract(body, '$.{amount}'))" if amount else "0"
+            sql, params = f"SELECT {self._expr(name, field)}, COUNT(*), {total} FROM {name} WHERE {self._expr(name, field)} IS NOT NULL", ()
+            if where is not None:
+                sql += f" AND {self._expr(name, where[0])}=?"
+                params = (_normalize(name, *where),)
+            if only:
+                sql += f" AND {self._expr(name, field)}{only}"
+                params += tuple(_normalize(name, field, k) for k in keys)
+            rows = self._conn().execute(sql + " GROUP BY 1", params).fetchall()
+        return {key: (count, total) for key, count, total in rows}
+
+    def page_totals(self, file, spec, by, after=None, limit=50, descending=False):
+        """Up to ``limit`` (key, records, total) rows of a GROUPED_TOTALS table
+        ordered by (``by``, key), walked through its (``by``, key) index."""
+        sql, params = f"SELECT key, records, total FROM {self._totals_table(_name(file), spec)}", ()
+        if after is not None:
+            sql += f" WHERE ({by}, key) {'<' if descending else '>'} (?, ?)"
+            params = tuple(after)
+        order = " DESC" if descending else ""
+        return self._conn().execute(sql + f" ORDER BY {by}{order}, key{order} LIMIT ?", params + (limit,)).fetchall()
+
+    # Mutators return (result, generation_before, generation_after), both read
+    # inside the write transaction so the facade can patch its snapshot.
+    def _mutate(self, file, fn):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = self.generation(file, conn)
+            result = fn(conn, _name(file))
+            after = self.generation(file, conn)
+            conn.execute("COMMIT")
+            return result, before, after
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def insert(self, file, record):
+        record.setdefault("id", str(uuid.uuid4()))
+        def op(conn, name):
+            conn.execute(f"INSERT INTO {name} (id, body) VALUES (?, ?)", (record["id"], json.dumps(record)))
+            return record
+        return self._mutate(file, op)
+
+    def update(self, file, id, changes):
+        def op(conn, name):
+            row = conn.execute(f"SELECT body FROM {name} WHERE id=?", (id,)).fetchone()
+            if row is None:
+                return None
+            record = json.loads(row[0])
+            delta = changes(dict(record)) if callable(changes) else changes
+            if delta is None:
+                return record
+            record.update(delta)
+            conn.execute(f"UPDATE {name} SET body=? WHERE id=?", (json.dumps(record), id))
+            return record
+        return self._mutate(file, op)
+
+    def delete(self, file, id):
+        def op(conn, name):
+            row = conn.execute(f"SELECT body FROM {name} WHERE id=?", (id,)).fetchone()
+            if row is not None:
+                conn.execute(f"DELETE FROM {name} WHERE id=?", (id,))
+            return json.loads(row[0]) if row else None
+        return self._mutate(file, op)
+
+    def prune(self, file, field, cutoff=None, keep=None):
+        def op(conn, name):
+            expr = self._expr(name, field)
+            doomed = []
+            if cutoff is not None:
+                doomed = [id for (id,) in conn.execute(f"SELECT id FROM {name} WHERE {expr} < ?", (cutoff,)).fetchall()]
+                conn.executemany(f"DELETE FROM {name} WHERE id=?", [(id,) for id in doomed])
+            if keep is not None:
+                excess = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0] - keep
+                if excess > 0:
+                    oldest = [id for (id,) in conn.execute(f"SELECT id FROM {name} ORDER BY {expr} LIMIT ?", (excess,)).fetchall()]
+                    conn.executemany(f"DELETE FROM {name} WHERE id=?", [(id,) for id in oldest])
+                    doomed += oldest
+            return doomed
+        return self._mutate(file, op)
+
+
+def migrate_from_json(backend, conn, force=False):
+    """One-shot import of data/*.json into SQLite.
+
+    Runs automatically the first time the database is opened; each collection
+    is imported once and recorded in ``meta`` so later runs are no-ops.
+    """
+    for file in COLLECTIONS:
+        name = _name(file)
+        key = f"migrated:{name}"
+        if not force and conn.execute("SELECT 1 FROM meta WHERE key=?", (key,)).fetchone():
+            continue
+        records = json.loads(file.read_text()) if file.exists() else []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Re-check under the write lock: the other worker may have just
+            # migrated, and its users may already have written new rows
+            if not force and conn.execute("SELECT 1 FROM meta WHERE key=?", (key,)).fetchone():
+                conn.execute("ROLLBACK")
+                continue
+            backend._replace(conn, name, records)
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(len(records))))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+
+def _make_backend():
+    if Config.DATA_BACKEND == "json":
+        return JsonBackend()
+    if Config.DATA_BACKEND == "sqlite":
+        return SqliteBackend(Config.DATA_DB)
+    raise ValueError(f"Unknown DATA_BACKEND: {Config.DATA_BACKEND}")
+
+backend = _make_backend()
+
+
+class _Snapshot:
+    """Parsed collection plus hash indexes, valid for one backend generation.
+
+    ``by_id`` is the primary-key index and doubles as the ordered record list;
+    secondary indexes (normalized field value -> {id: record}, one entry per
+    element for list fields) and grouped totals are built on first use and
+    then maintained alongside single-record writes. Sorted orders used for
+    paging, over records or over grouped totals, are rebuilt lazily after a
+    write.
+    """
+
+    def __init__(self, name, token, records):
+        self.name = name
+        self.token = token
+        self.by_id = {r.get("id"): r for r in records}
+        self.indexes = {}
+        self.totals = {}  # (field, amount, where) -> {field value: [records, sum of amount]}
+        self.orders = {}
+
+    def index(self, field):
+        idx = self.indexes.get(field)
+        if idx is None:
+            idx = {}
+            for id, r in self.by_id.items():
+                for key in self._keys(field, r):
+                    idx.setdefault(key, {})[id] = r
+            self.indexes[field] = idx
+        return idx
+
+    def group_totals(self, field, amount=None, where=None):
+        spec = (field, amount, where)
+        totals = self.totals.get(spec)
+        if totals is None:
+            totals = self.totals[spec] = {}
+            for r in self.by_id.values():
+                self._total(spec, totals, r, 1)
+        return totals
+
+    def _total(self, spec, totals, record, sign):
+        field, amount, where = spec
+        if where is not None and _normalize(self.name, where[0], record.get(where[0])) != _normalize(self.name, *where):
+            return
+        value = record.get(amount) if amount else 0
+        if not isinstance(value, (int, float)):
+            value = 0
+        for key in self._keys(field, record):
+            if key is None:
+                continue
+            entry = totals.setdefault(key, [0, 0])
+            entry[0] += sign
+            entry[1] += sign * value
+            if not entry[0]:
+                del totals[key]
+
+    def ordered(self, field, index=None):
+        """Sorted [(sort_key, id)] over the whole collection, or over the
+        bucket of ``index``, a (field, normalized value) pair."""
+        name = field if index is None else (field, index)
+        order = self.orders.get(name)
+        if order is None:
+            records = self.by_id if index is None else self.index(index[0]).get(index[1], {})
+            order = self.orders[name] = sorted((sort_key(r.get(field)), id) for id, r in records.items())
+        return order
+
+    def ordered_totals(self, spec, by):
+        """Sorted [(records or sum, group value)] over one grouped total."""
+        order = self.orders.get((spec, by))
+        if order is None:
+            pick = 0 if by == "records" else 1
+            order = self.orders[(spec, by)] = sorted((entry[pick], key) for key, entry in self.group_totals(*spec).items())
+        return order
+
+    def _keys(self, field, record):
+        value = record.get(field)
+        values = value if isinstance(value, list) else [value]
+        keys = []
+        for v in values:
+            try:
+                hash(v)
+            except TypeError:
+                continue
+            keys.append(_normalize(self.name, field, v))
+        return keys
+
+    def put(self, record):
+        self.orders.clear()
+        id = record.get("id")
+        old = self.by_id.get(id)
+        if old is None:
+            self.by_id[id] = record
+            for field, idx in self.indexes.items():
+                for key in self._keys(field, record):
+                    idx.setdefault(key, {})[id] = record
+            for spec, totals in self.totals.items():
+                self._total(spec, totals, record, 1)
+            return
+        for spec, totals in self.totals.items():
+            self._total(spec, totals, old, -1)
+        # Update in place so the record keeps its position in every index
+        # whose key did not change.
+        old_keys = {field: self._keys(field, old) for field in self.indexes}
+        old.clear()
+        old.update(record)
+        for field, idx in self.indexes.items():
+            new_keys = self._keys(field, old)
+            for key in old_keys[field]:
+                if key not in new_keys:
+                    self._unlink(idx, key, id)
+            for key in new_keys:
+                if key not in old_keys[field]:
+                    idx.setdefault(key, {})[id] = old
+        for spec, totals in self.totals.items():
+            self._total(spec, totals, old, 1)
+
+    def remove(self, id):
+        self.orders.clear()
+        old = self.by_id.pop(id, None)
+        if old is not None:
+            for field, idx in self.indexes.items():
+                for key in self._keys(field, old):
+                    self._unlink(idx, key, id)
+            for spec, totals in self.totals.items():
+                self._total(spec, totals, old, -1)
+
+    @staticmethod
+    def _unlink(idx, key, id):
+        bucket = idx.get(key)
+        if bucket is not None:
+            bucket.pop(id, None)
+            if not bucket:
+                del idx[key]
+
+
+# Snapshots keyed by collection name. A snapshot is only served while the
+# backend reports the same generation, so writes made by the other gunicorn
+# worker are picked up on the next access. All snapshot access happens under
+# _cache_lock because writers patch snapshots in place.
+_cache = {}
+_cache_lock = threading.RLock()
+
+
+def generation(file):
+    return backend.generation(file)
+
+
+def instance():
+    """Identifies the store, so generations from different databases never compare equal."""
+    return backend.instance()
+
+
+def _snapshot(file, load=True):
+    """Current snapshot for ``file``; with load=False, None instead of a reload."""
+    name = _name(file)
+    # Read the generation before loading: if a write lands in between, the
+    # snapshot is newer than its token and the next access reloads it.
+    token = backend.generation(file)
+    snap = _cache.get(name)
+    if snap is not None and snap.token == token:
+        return snap
+    if not load:
+        return None
+    snap = _Snapshot(name, token, backend.read(file))
+    with _cache_lock:
+        _cache[name] = snap
+    return snap
+
+
+def _apply(file, before, after, fn):
+    """Patch the cached snapshot after a write, or drop it if it was stale."""
+    name = _name(file)
+    with _cache_lock:
+        snap = _cache.get(name)
+        if snap is None:
+            return
+        if snap.token == before and before != after:
+            fn(snap)
+            snap.token = after
+        else:
+            del _cache[name]
+
+
+def _copy(record):
+    return dict(record) if record is not None else None
 
-def ensure():
-    BASE.joinpath("data").mkdir(exist_ok=True)
-    for f in (USERS, BOOKS, PURCHASES, PAYMENTS):
-        if not f.exists():
-            f.write_text("[]")
 
 def read(file):
-    ensure()
-    return json.loads(Path(file).read_text())
+    # Callers mutate what they get back, so hand out per-record copies.
+    snap = _snapshot(file)
+    with _cache_lock:
+        return [dict(r) for r in snap.by_id.values()]
 
 def write(file, data):
-    ensure()
-    Path(file).write_text(json.dumps(data, indent=2))
+    backend.write(file, data)
+    with _cache_lock:
+        _cache.pop(_name(file), None)
+
+# Single-record operations; prefer these over read()/write() round trips.
+# Lookups hit the snapshot's hash indexes when it is current; the SQLite
+# backend answers from its own B-tree indexes rather than reloading a table
+# another worker just changed.
+def get_record(file, id):
+    snap = _snapshot(file, load=not backend.indexed)
+    if snap is None:
+        return backend.get(file, id)
+    with _cache_lock:
+        return _copy(snap.by_id.get(id))
+
+def find_records(file, field, value):
+    snap = _snapshot(file, load=not backend.indexed)
+    if snap is None:
+        return backend.find(file, field, value)
+    with _cache_lock:
+        bucket = snap.index(field).get(_normalize(snap.name, field, value), {})
+        return [dict(r) for r in bucket.values()]
+
+def find_record(file, field, value):
+    found = find_records(file, field, value)
+    return found[0] if found else None
+
+def count_records(file, field=None, value=None):
+    """Number of records, or of those whose ``field`` equals ``value``
+    (answered from the field's index, so list it in SECONDARY_INDEXES)."""
+    snap = _snapshot(file, load=not backend.indexed)
+    if snap is None:
+        return backend.count(file, field, value)
+    with _cache_lock:
+        if field is None:
+            return len(snap.by_id)
+        return len(snap.index(field).get(_normalize(snap.name, field, value), {}))
+
+def insert_record(file, record):
+    record, before, after = backend.insert(file, record)
+    _apply(file, before, after, lambda snap: snap.put(dict(record)))
+    return record
+
+def update_record(file, id, changes):
+    """Merge ``changes`` into a record atomically; None if it does not exist.
+
+    ``changes`` may be a callable taking the current record and returning the
+    changes to apply, or None to leave it untouched. It runs under the store's
+    write lock, which makes check-then-update sequences race free.
+    """
+    record, before, after = backend.update(file, id, changes)
+    if before != after:
+        _apply(file, before, after, lambda snap: snap.put(dict(record)))
+    return record
+
+def delete_record(file, id):
+    record, before, after = backend.delete(file, id)
+    if before != after:
+        _apply(file, before, after, lambda snap: snap.remove(id))
+    return record
+
+def prune(file, field, cutoff=None, keep=None):
+    """Delete records whose ``field`` sorts before ``cutoff``, then the oldest
+    by ``field`` beyond ``keep`` records; returns how many were deleted.
+
+    Meant for string timestamps such as createdAt. The SQLite backend finds
+    the records through the field's expression index (list it in
+    SECONDARY_INDEXES), so a call that deletes nothing is cheap and leaves
+    snapshots current.
+    """
+    removed, before, after = backend.prune(file, field, cutoff, keep)
+    if before != after:
+        def remove(snap):
+            for id in removed:
+                snap.remove(id)
+        _apply(file, before, after, remove)
+    return len(removed)
+
+def sort_key(value):
+    """Total order over mixed JSON values: missing < numbers < strings < rest."""
+    if value is None:
+        return (0, 0)
+    if isinstance(value, (bool, int, float)):
+        return (1, float(value))
+    if isinstance(value, str):
+        return (2, value.lower())
+    return (3, json.dumps(value, sort_keys=True))
+
+
+def page_records(file, sort_field, after=None, limit=50, descending=False, index=None, where=None,
+                 start=None, stop=None):
+    """One keyset page of ``file`` ordered by (sort_key(sort_field), id).
+
+    ``after`` is the key returned for the previous page, ``index`` an optional
+    (field, value) pair restricting the scan to one secondary-index bucket and
+    ``where`` an optional predicate. ``start`` (inclusive) and ``stop``
+    (exclusive) bound the sort field's value; the range is found by bisection
+    rather than by scanning. Returns (records, key of the last record or None
+    when there are no more pages). Keys stay valid across writes, so paging
+    is stable while the collection changes.
+    """
+    snap = _snapshot(file)
+    with _cache_lock:
+        if index is not None:
+            field, value = index
+            index = (field, _normalize(snap.name, field, value))
+        order = snap.ordered(sort_field, index)
+        # (k,) sorts before every (k, id)
+        lo = bisect.bisect_left(order, (sort_key(start),)) if start is not None else 0
+        hi = bisect.bisect_left(order, (sort_key(stop),)) if stop is not None else len(order)
+        if descending:
+            first = min(bisect.bisect_left(order, after), hi) if after is not None else hi
+            keys = (order[i] for i in range(first - 1, lo - 1, -1))
+        else:
+            first = max(bisect.bisect_right(order, after), lo) if after is not None else lo
+            keys = (order[i] for i in range(first, hi))
+        page, last = [], None
+        for key in keys:
+            record = snap.by_id[key[1]]
+            if where is not None and not where(record):
+                continue
+            if len(page) == limit:
+                return page, last
+            page.append(dict(record))
+            last = key
+        return page, None
+
+
+def group_totals(file, field, amount=None, where=None, keys=None):
+    """{value of ``field``: (record count, sum of ``amount``)} in one pass.
+
+    ``where`` is an optional (field, value) filter; records without the field
+    are left out. ``keys`` restricts the result to those field values, such
+    as the user ids on one page. Meant for scalar fields such as foreign
+    keys: a per-user count and spend over payments, say. The snapshot keeps
+    the totals current across writes. Without a current snapshot the SQLite
+    backend reads the trigger-maintained table for specs listed in
+    GROUPED_TOTALS, or runs a GROUP BY for any other.
+    """
+    snap = _snapshot(file, load=not backend.indexed)
+    if snap is None:
+        return backend.group_totals(file, field, amount, where, keys)
+    with _cache_lock:
+        totals = snap.group_totals(field, amount, where)
+        if keys is not None:
+            return {key: tuple(totals[key]) for key in keys if key in totals}
+        return {key: tuple(entry) for key, entry in totals.items()}
+
+
+def page_totals(file, field, amount=None, where=None, by="records", after=None, limit=50, descending=False):
+    """One keyset page of group_totals() ordered by (``by``, field value).
+
+    ``by`` is "records" or "total" and ``after`` the key returned for the
+    previous page. Returns ([(field value, records, total)], key of the last
+    row or None when there are no more pages). The SQLite backend pages specs
+    listed in GROUPED_TOTALS straight from their indexed table, so a page
+    costs the same however many groups there are; anything else is sorted
+    from the snapshot once per generation.
+    """
+    if by not in ("records", "total"):
+        raise ValueError(f"Cannot order grouped totals by {by!r}")
+    spec = (field, amount, where)
+    if backend.indexed and spec in GROUPED_TOTALS.get(_name(file), []):
+        rows = backend.page_totals(file, spec, by, after, limit + 1, descending)
+    else:
+        snap = _snapshot(file)
+        with _cache_lock:
+            order = snap.ordered_totals(spec, by)
+            if descending:
+                first = bisect.bisect_left(order, tuple(after)) if after is not None else len(order)
+                keys = order[max(0, first - limit - 1):first][::-1]
+            else:
+                first = bisect.bisect_right(order, tuple(after)) if after is not None else 0
+                keys = order[first:first + limit + 1]
+            totals = snap.totals[spec]
+            rows = [(key, *totals[key]) for _, key in keys]
+    pick = 1 if by == "records" else 2
+    last = (rows[limit - 1][pick], rows[limit - 1][0]) if len(rows) > limit else None
+    return rows[:limit], last
+
+
+def index_values(file, field):
+    """Distinct values of ``field`` (list elements for list fields)."""
+    snap = _snapshot(file)
+    with _cache_lock:
+        return list(snap.index(field).keys())
 
 def get_users(): return read(USERS)
 def save_users(u): write(USERS, u)
@@ -29,3 +961,15 @@ def get_purchases(): return read(PURCHASES)
 def save_purchases(p): write(PURCHASES, p)
 def get_payments(): return read(PAYMENTS)
 def save_payments(p): write(PAYMENTS, p)
+
+
+if __name__ == "__main__":
+    # python data_store.py migrate  -> re-import data/*.json into the SQLite store
+    if sys.argv[1:2] == ["migrate"]:
+        if not isinstance(backend, SqliteBackend):
+            raise SystemExit("DATA_BACKEND is not sqlite; nothing to migrate")
+        migrate_from_json(backend, backend._conn(), force=True)
+        for file in COLLECTIONS:
+            print(f"{_name(file)}: {count_records(file)} records")
+    else:
+        print("usage: python data_store.py migrate")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""Login storm load test: do other endpoints stay responsive?
+
+Starts the app under gunicorn exactly as the Procfile does (on a free port,
+with a scratch copy of the database), measures /api/health and /api/books/
+latency on their own, then again while many threads hammer /api/auth/login
+with wrong passwords, each of which costs a full bcrypt run. Per-IP and
+per-email limits are lifted for the server under test, since all storm
+traffic comes from one address, so what is measured is the bcrypt pool and
+its 429 backpressure.
+
+Run: python load_test_login.py [--seconds 10] [--storm-threads 32] [--ignore-retry-after]
+                                [--command "gunicorn app:application ..."] [--url URL]
+With --url an already running server is measured instead; its rate limits
+then apply as configured.
+"""
+
+import argparse
+import json
+import os
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from config import Config
+
+ROOT = Path(__file__).parent
+PROBES = ["/api/health", "/api/books/"]
+LOGIN_EMAIL = "admin@demo.com"
+
+
+def request(url, body=None):
+    """(status, Retry-After header or None)."""
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            response.read()
+            return response.status, None
+    except urllib.error.HTTPError as err:
+        return err.code, err.headers.get("Retry-After")
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(scratch, command):
+    port = free_port()
+    command = command.replace("0.0.0.0:$PORT", f"127.0.0.1:{port}")
+    db = Path(scratch) / "elibrary.db"
+    if Path(Config.DATA_DB).exists():
+        shutil.copy(Config.DATA_DB, db)
+    env = dict(os.environ, DATA_DB=str(db), LOGIN_RATE_PER_IP="1000000", LOGIN_FAILURES_PER_EMAIL="1000000")
+    server = subprocess.Popen(re.split(r"\s+", command), cwd=ROOT, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if request(url + "/api/health")[0] == 200:
+                return server, url
+        except OSError:
+            time.sleep(0.2)
+    server.terminate()
+    sys.exit("server did not start")
+
+
+def probe(url, seconds):
+    """Sequential requests to PROBES for ``seconds``; latencies in ms per path."""
+    latencies = {path: [] for path in PROBES}
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        for path in PROBES:
+            start = time.perf_counter()
+            request(url + path)
+            latencies[path].append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def storm(url, stop, codes, lock, honor_retry_after):
+    while not stop.is_set():
+        # A fresh wrong password each time, so the negative cache cannot answer it
+        status, retry_after = request(url + "/api/auth/login", {"email": LOGIN_EMAIL, "password": uuid.uuid4().hex})
+        with lock:
+            codes[status] += 1
+        if retry_after and honor_retry_after:
+            stop.wait(float(retry_after))
+
+
+def report(label, latencies):
+    for path, values in latencies.items():
+        values = sorted(values)
+        p95 = values[int(len(values) * 0.95) - 1] if len(values) >= 20 else values[-1]
+        print(f"  {label:<6} {path:<14} n={len(values):<5} p50 {statistics.median(values):7.1f} ms  p95 {p95:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--storm-threads", type=int, default=32)
+    parser.add_argument("--url")
+    parser.add_argument("--command", help="gunicorn command line to test instead of the Procfile's")
+    parser.add_argument("--ignore-retry-after", action="store_true",
+                        help="storm threads retry at once instead of waiting as told on 429")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp()
+    server = None
+    try:
+        if args.url:
+            url = args.url.rstrip("/")
+        else:
+            command = args.command or (ROOT / "Procfile").read_text().split(":", 1)[1].strip()
+            server, url = start_server(scratch, command)
+            print(command)
+        baseline = probe(url, args.seconds)
+
+        stop, lock, codes = threading.Event(), threading.Lock(), Counter()
+        threads = [threading.Thread(target=storm, args=(url, stop, codes, lock, not args.ignore_retry_after)) for _ in range(args.storm_threads)]
+        for thread in threads:
+            thread.start()
+        time.sleep(1)
+        loaded = probe(url, args.seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        print(f"login storm: {args.storm_threads} threads, {sum(codes.values())} logins, "
+              + ", ".join(f"{code}: {n}" for code, n in sorted(codes.items())))
+        report("idle", baseline)
+        report("storm", loaded)
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt
-from data_store import get_users, get_payments, get_purchases, save_users
+from data_store import USERS, PAYMENTS, PURCHASES, get_users, get_payments, get_record, find_records, count_records, update_record, delete_record, group_totals, page_records, page_totals, sort_key
+from utils.http_cache import cached_json
+from utils.pagination import parse_limit, parse_sort, encode_cursor, decode_cursor
+from utils import analytics, ledger
+import heapq
+import itertools
 from datetime import datetime
 
 admin_bp = Blueprint("admin", __name__)
@@ -12,36 +17,107 @@ def admin_required():
         return jsonify({"error": "Admin access required"}), 403
     return None
 
+CUSTOMER_PARAMS = ("limit", "cursor", "sort")
+# Sort field -> user field; the others are per-customer totals
+CUSTOMER_SORT_FIELDS = {"name": "name", "email": "email", "joinedAt": "createdAt", "purchaseCount": None, "totalSpent": None}
+
 @admin_bp.route("/customers", methods=["GET"])
 @jwt_required()
 def get_customers():
     err = admin_required()
     if err: return err
-    
-    users = get_users()
-    purchases = get_purchases()
-    payments = get_payments()
-    
-    # Build customer list with stats
-    customers = []
-    for user in users:
-        if user.get("isAdmin"):
-            continue  # Skip admin users
-        
-        user_purchases = [p for p in purchases if p.get("userId") == user["id"]]
-        user_payments = [p for p in payments if p.get("userId") == user["id"]]
-        total_spent = sum(p.get("amount", 0) for p in user_payments if p.get("status") == "success")
-        
-        customers.append({
-            "id": user["id"],
-            "name": user["name"],
-            "email": user["email"],
-            "purchaseCount": len(user_purchases),
-            "totalSpent": total_spent,
-            "joinedAt": user.get("createdAt", "N/A")
-        })
-    
-    return jsonify(customers)
+    # Without paging parameters keep returning every customer as an array
+    if not any(p in request.args for p in CUSTOMER_PARAMS):
+        return cached_json([USERS, PURCHASES, PAYMENTS], _customer_list, private=True)
+    try:
+        limit = parse_limit(request.args.get("limit"))
+        sort, descending = parse_sort(request.args.get("sort"), CUSTOMER_SORT_FIELDS, "joinedAt")
+        after = decode_cursor(request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return cached_json([USERS, PURCHASES, PAYMENTS], lambda: _customer_page(sort, descending, after, limit), private=True)
+
+# Sort field -> (collection, amount, where, column) of its grouped total
+CUSTOMER_TOTALS = {
+    "purchaseCount": (PURCHASES, None, None, "records"),
+    "totalSpent": (PAYMENTS, "amount", ("status", "success"), "total"),
+}
+
+def _customer_totals(keys=None):
+    """Purchase count and successful spend per user id, for ``keys`` or everyone."""
+    purchases = group_totals(PURCHASES, "userId", keys=keys)
+    spent = group_totals(PAYMENTS, "userId", "amount", ("status", "success"), keys=keys)
+    return purchases, spent
+
+def _customer(user, purchases, spent):
+    return {
+        "id": user["id"],
+        "name": user["name"],
+        "email": user["email"],
+        "purchaseCount": purchases.get(user["id"], (0, 0))[0],
+        "totalSpent": spent.get(user["id"], (0, 0))[1],
+        "joinedAt": user.get("createdAt", "N/A")
+    }
+
+def _customer_list():
+    purchases, spent = _customer_totals()
+    return [_customer(user, purchases, spent) for user in get_users() if not user.get("isAdmin")]
+
+def _customers(users):
+    purchases, spent = _customer_totals([u["id"] for u in users])
+    return [_customer(u, purchases, spent) for u in users]
+
+def _customer_page(sort, descending, after, limit):
+    field = CUSTOMER_SORT_FIELDS[sort]
+    if field is not None:
+        users, last = page_records(USERS, field, after=after, limit=limit, descending=descending,
+                                   where=lambda u: not u.get("isAdmin"))
+        return {"items": _customers(users), "nextCursor": encode_cursor(last)}
+
+    # Ordered by a total, keyed (sort_key(total), id) like page_records.
+    # Customers with a non-zero total come from the indexed totals table;
+    # everyone else ties at zero and is paged from the users by id. Totals
+    # are never negative, so the zero band sorts first.
+    in_zero = after is not None and after[0] == sort_key(0)
+    ranked = _ranked_customers(sort, None if in_zero else after, descending, limit)
+    unranked = _unranked_customers(sort, after if in_zero else None, descending, limit)
+    if descending:
+        bands = [unranked] if in_zero else [ranked, unranked]
+    else:
+        bands = [unranked, ranked] if after is None or in_zero else [ranked]
+    keys = list(itertools.islice(itertools.chain(*bands), limit + 1))
+    page = _customers([user for _, user in keys[:limit]])
+    return {"items": page, "nextCursor": encode_cursor(keys[limit - 1][0]) if len(keys) > limit else None}
+
+def _ranked_customers(sort, after, descending, batch):
+    """(key, user) for customers with a non-zero total, in total order."""
+    file, amount, where, by = CUSTOMER_TOTALS[sort]
+    after = (after[0][1], after[1]) if after is not None else None
+    while True:
+        rows, after = page_totals(file, "userId", amount, where, by=by, after=after, limit=batch, descending=descending)
+        for id, records, total in rows:
+            value = records if by == "records" else total
+            if not value:
+                continue
+            user = get_record(USERS, id)
+            if user and not user.get("isAdmin"):
+                yield (sort_key(value), id), user
+        if after is None:
+            return
+
+def _unranked_customers(sort, after, descending, batch):
+    """(key, user) for customers whose total is zero, in id order."""
+    file, amount, where, by = CUSTOMER_TOTALS[sort]
+    after = (sort_key(after[1]), after[1]) if after is not None else None
+    while True:
+        users, after = page_records(USERS, "id", after=after, limit=batch, descending=descending,
+                                    where=lambda u: not u.get("isAdmin"))
+        totals = group_totals(file, "userId", amount, where, keys=[u["id"] for u in users])
+        for user in users:
+            if not totals.get(user["id"], (0, 0))[0 if by == "records" else 1]:
+                yield (sort_key(0), user["id"]), user
+        if after is None:
+            return
 
 @admin_bp.route("/customer/<customer_id>", methods=["GET"])
 @jwt_required()
@@ -49,16 +125,12 @@ def get_customer_details(customer_id):
     err = admin_required()
     if err: return err
     
-    users = get_users()
-    user = next((u for u in users if u["id"] == customer_id), None)
+    user = get_record(USERS, customer_id)
     if not user:
         return jsonify({"error": "Customer not found"}), 404
     
-    purchases = get_purchases()
-    payments = get_payments()
-    
-    user_purchases = [p for p in purchases if p.get("userId") == customer_id]
-    user_payments = [p for p in payments if p.get("userId") == customer_id]
+    user_purchases = find_records(PURCHASES, "userId", customer_id)
+    user_payments = find_records(PAYMENTS, "userId", customer_id)
     
     return jsonify({
         "id": user["id"],
@@ -75,18 +147,13 @@ def update_customer(customer_id):
     if err: return err
     
     data = request.get_json() or {}
-    users = get_users()
-    user = next((u for u in users if u["id"] == customer_id), None)
-    if not user:
-        return jsonify({"error": "Customer not found"}), 404
     
     # Update allowed fields
-    if "name" in data:
-        user["name"] = data["name"]
-    if "email" in data:
-        user["email"] = data["email"]
+    changes = {k: data[k] for k in ("name", "email") if k in data}
+    user = update_record(USERS, customer_id, changes)
+    if not user:
+        return jsonify({"error": "Customer not found"}), 404
     
-    save_users(users)
     return jsonify({"message": "Customer updated", "customer": user})
 
 @admin_bp.route("/customer/<customer_id>", methods=["DELETE"])
@@ -95,16 +162,14 @@ def delete_customer(customer_id):
     err = admin_required()
     if err: return err
     
-    users = get_users()
-    user = next((u for u in users if u["id"] == customer_id), None)
+    user = get_record(USERS, customer_id)
     if not user:
         return jsonify({"error": "Customer not found"}), 404
     
     if user.get("isAdmin"):
         return jsonify({"error": "Cannot delete admin users"}), 400
     
-    users = [u for u in users if u["id"] != customer_id]
-    save_users(users)
+    delete_record(USERS, customer_id)
     return jsonify({"message": "Customer deleted"})
 
 @admin_bp.route("/payments", methods=["GET"])
@@ -113,8 +178,36 @@ def get_all_payments():
     err = admin_required()
     if err: return err
     
-    payments = get_payments()
-    return jsonify(payments)
+    # Without query parameters keep returning every payment as an array
+    if not request.args:
+        return cached_json([PAYMENTS], get_payments, private=True)
+    try:
+        query = ledger.parse_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return cached_json([PAYMENTS], lambda: ledger.page_response(query), private=True)
+
+@admin_bp.route("/payments/export", methods=["GET"])
+@jwt_required()
+def export_payments():
+    err = admin_required()
+    if err: return err
+    
+    fmt = request.args.get("format", "csv")
+    if fmt not in ("csv", "ndjson"):
+        return jsonify({"error": "format must be csv or ndjson"}), 400
+    try:
+        query = ledger.parse_query(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # Rows are written as they are read, one page of payments at a time
+    rows = ledger.export_csv(query) if fmt == "csv" else ledger.export_ndjson(query)
+    mimetype = "text/csv" if fmt == "csv" else "application/x-ndjson"
+    stamp = datetime.utcnow().strftime("%Y%m%d-%H%M%S")
+    return Response(stream_with_context(rows), mimetype=mimetype, headers={
+        "Content-Disposition": f"attachment; filename=payments-{stamp}.{fmt}",
+        "Cache-Control": "private, no-store",
+    })
 
 @admin_bp.route("/analytics", methods=["GET"])
 @jwt_required()
@@ -122,26 +215,47 @@ def get_analytics():
     err = admin_required()
     if err: return err
     
-    users = get_users()
-    payments = get_payments()
-    purchases = get_purchases()
-    
-    total_customers = len([u for u in users if not u.get("isAdmin")])
-    total_revenue = sum(p.get("amount", 0) for p in payments if p.get("status") == "success")
-    total_transactions = len(payments)
-    successful_payments = len([p for p in payments if p.get("status") == "success"])
-    
-    # Payment method breakdown
-    card_payments = len([p for p in payments if p.get("method") == "card" and p.get("status") == "success"])
-    upi_payments = len([p for p in payments if p.get("method") == "upi" and p.get("status") == "success"])
+    # Running totals kept by utils.analytics; no pass over the payments
+    stats = analytics.current()
+    totals = stats.get("totals", {}).get("all", {})
+    methods = stats.get("methods", {})
+    total_customers = count_records(USERS) - count_records(USERS, "isAdmin", True)
     
     return jsonify({
         "totalCustomers": total_customers,
-        "totalRevenue": total_revenue,
-        "totalTransactions": total_transactions,
-        "successfulPayments": successful_payments,
+        "totalRevenue": totals.get("revenue", 0),
+        "totalTransactions": totals.get("transactions", 0),
+        "successfulPayments": totals.get("successful", 0),
         "paymentMethods": {
-            "card": card_payments,
-            "upi": upi_payments
-        }
+            "card": methods.get("card", {}).get("successful", 0),
+            "upi": methods.get("upi", {}).get("successful", 0)
+        },
+        "paymentStatus": {status: entry.get("transactions", 0) for status, entry in stats.get("status", {}).items()}
     })
+
+@admin_bp.route("/analytics/series", methods=["GET"])
+@jwt_required()
+def get_analytics_series():
+    err = admin_required()
+    if err: return err
+    
+    period = request.args.get("period", "day")
+    if period not in ("day", "month"):
+        return jsonify({"error": "period must be day or month"}), 400
+    start, end = request.args.get("from"), request.args.get("to")
+    return jsonify(analytics.series(analytics.current(), period, start, end))
+
+@admin_bp.route("/analytics/books", methods=["GET"])
+@jwt_required()
+def get_analytics_books():
+    err = admin_required()
+    if err: return err
+    
+    try:
+        limit = parse_limit(request.args.get("limit"), default=10)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    books = analytics.current().get("books", {})
+    top = heapq.nlargest(limit, books.items(), key=lambda kv: (kv[1].get("revenue", 0), kv[1].get("transactions", 0)))
+    return jsonify([{"bookId": id, "transactions": e.get("transactions", 0), "successful": e.get("successful", 0),
+                     "revenue": e.get("revenue", 0)} for id, e in top])
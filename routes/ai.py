@@ -1,54 +1,72 @@
-from flask import Blueprint, request, jsonify
-from data_store import get_books
+from flask import Blueprint, request, jsonify, g
+from data_store import BOOKS, get_record, update_record
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request, get_jwt
-from utils.pdf_extract import extract_text_from_pdf_bytes
-import requests
+from utils.pdf_extract import extract_text_cached, cached_text
+from utils.search_index import save_book_text
+from utils.jobs import latest_job
+from utils import summary_cache, text_cache
+from utils.summarizer import summarize_text
+from utils import llm, remote, s3
+from utils.remote import RemoteFileTooLarge
+from pathlib import Path
+from collections import Counter
+from itertools import repeat
+from operator import itemgetter
+import heapq
+import re
 from config import Config
 
 ai_bp = Blueprint("ai", __name__)
 
+SUMMARY_STOPWORDS = frozenset(["the","and","for","that","with","this","from","are","was","were","have","has","not","but","you","your","they","their","will","would","can","could","about","into","than","them","then"])
+
+CATEGORY_KEYWORDS = {
+    "Fiction": ["story", "character", "novel", "tale", "narrative"],
+    "Romance": ["love", "heart", "romance", "relationship", "passion"],
+    "Mystery": ["mystery", "detective", "crime", "murder", "investigation"],
+    "Fantasy": ["magic", "wizard", "dragon", "fantasy", "quest"],
+    "Science Fiction": ["space", "future", "technology", "robot", "alien"],
+    "Horror": ["horror", "fear", "terror", "ghost", "dark"],
+    "Adventure": ["adventure", "journey", "travel", "explore", "quest"],
+    "Classic": ["classic", "literature", "society", "tradition"],
+    "Historical": ["history", "war", "historical", "century", "past"],
+    "Biography": ["life", "biography", "memoir", "born", "lived"]
+}
+
+# Words, plus a " " token at every sentence break
+_token_or_break = re.compile(r'\w+|(?<=[.!?])\s')
+
 def simple_summarize(text, num_sentences=5):
-    import re, math
-    clean = re.sub(r'\s+', ' ', text).strip()
+    # Same as re.sub(r'\s+', ' ', text).strip(): str.split() and \s agree on whitespace
+    clean = " ".join(text.split())
     sentences = re.split(r'(?<=[.!?])\s+', clean)
-    words = re.findall(r'\w+', clean.lower())
-    stopwords = set(["the","and","for","that","with","this","from","are","was","were","have","has","not","but","you","your","they","their","will","would","can","could","about","into","than","them","then"])
-    freq = {}
-    for w in words:
-        if w in stopwords or len(w)<3: continue
-        freq[w] = freq.get(w,0)+1
+    # Tokenize once; sentence scores come from slices of the token stream
+    tokens = _token_or_break.findall(clean.lower())
+    counts = Counter(tokens)
+    freq = {w: c for w, c in counts.items() if len(w) >= 3 and w not in SUMMARY_STOPWORDS}
     if freq:
         maxf = max(freq.values())
         for k in freq: freq[k]=freq[k]/maxf
-    scored = []
-    for s in sentences:
-        s_words = re.findall(r'\w+', s.lower())
-        score = sum(freq.get(w,0) for w in s_words)
-        scored.append((score,s))
-    ranked = sorted(range(len(scored)), key=lambda i: scored[i][0], reverse=True)
-    top = sorted(ranked[:num_sentences])
+    scores = []
+    start = 0
+    for _ in sentences:
+        try:
+            end = tokens.index(" ", start)
+        except ValueError:
+            end = len(tokens)
+        scores.append(sum(map(freq.get, tokens[start:end], repeat(0))))
+        start = end + 1
+    top = sorted(heapq.nlargest(num_sentences, range(len(scores)), key=scores.__getitem__))
     summary = " ".join(sentences[i] for i in top)
-    keywords = sorted(freq.items(), key=lambda kv: kv[1], reverse=True)[:5]
-    kw = [k for k,v in keywords]
+    kw = [k for k,v in heapq.nlargest(5, freq.items(), key=itemgetter(1))]
     
-    # Simple category detection based on keywords
+    # Simple category detection based on keywords. Keywords are single
+    # words, so they occur in the text exactly when they occur inside one of
+    # its distinct tokens: match against those instead of the whole text.
+    vocabulary = " ".join(counts)
     categories = []
-    category_keywords = {
-        "Fiction": ["story", "character", "novel", "tale", "narrative"],
-        "Romance": ["love", "heart", "romance", "relationship", "passion"],
-        "Mystery": ["mystery", "detective", "crime", "murder", "investigation"],
-        "Fantasy": ["magic", "wizard", "dragon", "fantasy", "quest"],
-        "Science Fiction": ["space", "future", "technology", "robot", "alien"],
-        "Horror": ["horror", "fear", "terror", "ghost", "dark"],
-        "Adventure": ["adventure", "journey", "travel", "explore", "quest"],
-        "Classic": ["classic", "literature", "society", "tradition"],
-        "Historical": ["history", "war", "historical", "century", "past"],
-        "Biography": ["life", "biography", "memoir", "born", "lived"]
-    }
-    
-    text_lower = text.lower()
-    for category, keywords_list in category_keywords.items():
-        if any(keyword in text_lower for keyword in keywords_list):
+    for category, keywords_list in CATEGORY_KEYWORDS.items():
+        if any(keyword in counts or keyword in vocabulary for keyword in keywords_list):
             categories.append(category)
             if len(categories) >= 3:  # Limit to 3 categories
                 break
@@ -58,14 +76,50 @@ def simple_summarize(text, num_sentences=5):
     
     return summary, kw, categories
 
+def _read_book_file(filename):
+    """(open pdf file, None) for a book's file, or (None, error response).
+
+    The file is closed when the request ends.
+    """
+    if filename.startswith("http"):
+        # fetch remote
+        try:
+            g.book_file = remote.fetch(filename)
+            return g.book_file, None
+        except RemoteFileTooLarge as e:
+            return None, (jsonify({"error":"File too large", "details": str(e)}), 413)
+        except Exception as e:
+            return None, (jsonify({"error":"Failed to fetch book file", "details": str(e)}), 400)
+    # local, or the private S3 bucket read through the shared client
+    local = Path(Config.UPLOAD_FOLDER) / filename
+    if local.exists():
+        g.book_file = local.open("rb")
+    elif s3.ENABLED:
+        try:
+            g.book_file = s3.download(filename)
+        except Exception as e:
+            return None, (jsonify({"error":"Failed to fetch book file", "details": str(e)}), 400)
+    if g.get("book_file") is None:
+        return None, (jsonify({"error":"Local file not found"}), 404)
+    return g.book_file, None
+
+@ai_bp.teardown_request
+def _close_book_file(exc):
+    book_file = g.pop("book_file", None)
+    if book_file is not None:
+        book_file.close()
+
+def _set_categories(bookId, categories):
+    """Store detected categories, skipping the write when they are unchanged."""
+    update_record(BOOKS, bookId, lambda book: None if book.get("categories") == categories else {"categories": categories})
+
 @ai_bp.route("/summarize", methods=["POST"])
 # @jwt_required()
 def summarize():
     data = request.get_json() or {}
     bookId = data.get("bookId")
     if not bookId: return jsonify({"error":"bookId required"}), 400
-    books = get_books()
-    book = next((b for b in books if b["id"]==bookId), None)
+    book = get_record(BOOKS, bookId)
     if not book: return jsonify({"error":"Book not found"}), 404
 
     # get bytes either from URL or local filename
@@ -78,93 +132,78 @@ def summarize():
     }
     
     filename = book.get("filename", "")
+    refresh = request.args.get("refresh") in ("1", "true") or bool(data.get("refresh"))
+    started = summary_cache.timestamp()
+    text = pdf_file = None
     if filename in demo_content:
         text = demo_content[filename]
+        content_key = text_cache.content_key(text.encode())
     else:
-        # get bytes either from URL or local filename
-        pdf_bytes = None
-        if filename.startswith("http"):
-            # fetch remote
-            try:
-                r = requests.get(filename, timeout=30); r.raise_for_status(); pdf_bytes = r.content
-            except Exception as e:
-                return jsonify({"error":"Failed to fetch book file", "details": str(e)}), 400
-        else:
-            # local
-            from pathlib import Path
-            local = Path(Config.UPLOAD_FOLDER) / filename
-            if not local.exists():
-                return jsonify({"error":"Local file not found"}), 404
-            pdf_bytes = local.read_bytes()
-
-        text = extract_text_from_pdf_bytes(pdf_bytes)
+        job = latest_job(filename)
+        if job and job["status"] in ("queued", "running"):
+            return jsonify({"status": job["status"], "jobId": job["id"], "message": "Text extraction in progress, try again shortly"}), 202
+        # An extraction job already hashed the file; otherwise read and hash it
+        content_key = job.get("textKey") if job else None
+        if not content_key:
+            pdf_file, error = _read_book_file(filename)
+            if error: return error
+            content_key = text_cache.content_key(pdf_file)
+
+    if not refresh:
+        cached = summary_cache.get(content_key, "gemini" if llm.enabled() else "local-fallback")
+        if cached:
+            _set_categories(bookId, cached.get("categories", ["General"]))
+            return jsonify({**cached, "cached": True})
+
+    if text is None:
+        text = cached_text(content_key)
+    if text is None:
+        if pdf_file is None:
+            pdf_file, error = _read_book_file(filename)
+            if error: return error
+        text = extract_text_cached(pdf_file)
     if not text or len(text.strip())<10:
         return jsonify({"error":"No extractable text (scanned PDF?)"}), 400
+    save_book_text(bookId, text)
 
     # if GEMINI key is present you can implement API call here.
     # Gemini Integration
-    if Config.GEMINI_API_KEY:
+    if llm.enabled():
         try:
-            import google.generativeai as genai
-            genai.configure(api_key=Config.GEMINI_API_KEY)
-            model = genai.GenerativeModel('gemini-2.0-flash-exp')
-            
-            prompt = f"""
-            Analyze the following text from a book and provide a structured summary.
-            
-            Text:
-            {text[:30000]}... (truncated)
-            
-            Please provide:
-            1. A concise summary (max 200 words).
-            2. Key takeaways or themes (bullet points).
-            3. Main characters (if applicable).
-            4. Estimated reading time for the full text (based on {len(text.split())} words).
-            5. Book genre/categories (e.g., Fiction, Romance, Mystery, Fantasy, etc.) - provide 1-3 categories.
-            
-            Format the output as JSON with keys: summary, keywords (list of strings), reading_minutes (int), characters (list of strings), categories (list of strings).
-            """
-            
-            response = model.generate_content(prompt)
-            # Simple parsing of JSON from markdown block if needed
-            import json
-            content = response.text
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0]
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0]
-                
-            data = json.loads(content)
-            
+            # Concurrent requests for this book wait for one model run, within
+            # the same deadline as the run itself
+            gemini = llm.client()
+            with llm.single_flight(content_key, gemini):
+                result = summary_cache.get(content_key, "gemini", since=started if refresh else None)
+                cached = result is not None
+                if not cached:
+                    # Summarize every section of the book, not just its first 30k chars
+                    result = {**summarize_text(text, gemini, refresh), "source": "gemini"}
+                    summary_cache.put(content_key, "gemini", result)
+
             # Update book with categories
-            from data_store import save_books
-            book["categories"] = data.get("categories", ["General"])
-            save_books(books)
-            
-            return jsonify({
-                "summary": data.get("summary"),
-                "keywords": data.get("keywords", []),
-                "reading_minutes": data.get("reading_minutes", max(1, len(text.split())//200)),
-                "characters": data.get("characters", []),
-                "categories": data.get("categories", ["General"]),
-                "source": "gemini"
-            })
+            _set_categories(bookId, result["categories"])
+            return jsonify({**result, "cached": cached})
         except Exception as e:
             print(f"Gemini Error: {e}")
             # Fall through to local fallback
 
     # Local Fallback
+    if llm.enabled() and not refresh:
+        cached = summary_cache.get(content_key, "local-fallback")
+        if cached:
+            _set_categories(bookId, cached["categories"])
+            return jsonify({**cached, "cached": True})
     summary, keywords, categories = simple_summarize(text, num_sentences=6)
-    
-    # Update book with categories
-    from data_store import save_books
-    book["categories"] = categories
-    save_books(books)
-    
-    return jsonify({
+    result = {
         "summary": summary, 
         "keywords": keywords, 
         "reading_minutes": max(1, len(text.split())//200), 
         "categories": categories,
         "source": "local-fallback"
-    })
+    }
+    summary_cache.put(content_key, "local-fallback", result)
+
+    # Update book with categories
+    _set_categories(bookId, categories)
+    return jsonify({**result, "cached": False})
@@ -1,25 +1,47 @@
 from flask import Blueprint, request, jsonify, current_app
-from data_store import get_users, save_users
-import bcrypt, uuid
+from data_store import USERS, find_record, count_records, insert_record, update_record
+import uuid
 from flask_jwt_extended import create_access_token
+from config import Config
+from utils import passwords
+from utils.rate_limit import RateLimiter
 
 auth_bp = Blueprint("auth", __name__)
 
+# Attempts per client IP on both endpoints, and failed logins per (IP, email):
+# keyed by email alone, anyone could lock a user out by failing on purpose
+_ip_limit = RateLimiter(Config.LOGIN_RATE_PER_IP, Config.LOGIN_RATE_WINDOW)
+_failure_limit = RateLimiter(Config.LOGIN_FAILURES_PER_EMAIL, Config.LOGIN_FAILURE_WINDOW)
+
+def _too_many(message, retry_after):
+    response = jsonify({"error": message})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+def _busy():
+    return _too_many("Server busy, please retry shortly", 1)
+
 @auth_bp.route("/signup", methods=["POST"])
 def signup():
+    retry_after = _ip_limit.hit(request.remote_addr)
+    if retry_after:
+        return _too_many("Too many attempts, please wait", retry_after)
     data = request.get_json() or {}
     name = data.get("name"); email = data.get("email"); password = data.get("password")
     if not name or not email or not password:
         return jsonify({"error":"name, email and password required"}), 400
 
-    users = get_users()
-    if any(u for u in users if u["email"].lower()==email.lower()):
+    if find_record(USERS, "email", email):
         return jsonify({"error":"Email already in use"}), 400
 
-    is_admin = len(users)==0
-    pw_hash = bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    try:
+        pw_hash = passwords.hash_password(password)
+    except passwords.Busy:
+        return _busy()
+    is_admin = count_records(USERS)==0
     user = {"id": str(uuid.uuid4()), "name": name, "email": email, "passwordHash": pw_hash, "isAdmin": is_admin}
-    users.append(user); save_users(users)
+    insert_record(USERS, user)
     # Use the user id as the JWT identity (string) and place extra info in additional_claims
     token = create_access_token(identity=user["id"], additional_claims={"email": user["email"], "isAdmin": is_admin})
     safe = {"id": user["id"], "name": user["name"], "email": user["email"], "isAdmin": is_admin}
@@ -27,16 +49,33 @@ def signup():
 
 @auth_bp.route("/login", methods=["POST"])
 def login():
+    retry_after = _ip_limit.hit(request.remote_addr)
+    if retry_after:
+        return _too_many("Too many attempts, please wait", retry_after)
     data = request.get_json() or {}
     email = data.get("email"); password = data.get("password")
     if not email or not password:
         return jsonify({"error":"email and password required"}), 400
-    users = get_users()
-    user = next((u for u in users if u["email"].lower()==email.lower()), None)
+    email_key = (request.remote_addr, email.strip().lower())
+    retry_after = _failure_limit.retry_after(email_key)
+    if retry_after:
+        return _too_many("Too many failed logins for this account, please wait", retry_after)
+    user = find_record(USERS, "email", email)
     if not user:
+        _failure_limit.hit(email_key)
         return jsonify({"error":"Invalid credentials"}), 400
-    if not bcrypt.checkpw(password.encode(), user["passwordHash"].encode()):
+    try:
+        ok, new_hash = passwords.verify(password, user["passwordHash"])
+    except passwords.Busy:
+        return _busy()
+    if not ok:
+        _failure_limit.hit(email_key)
         return jsonify({"error":"Invalid credentials"}), 400
+    _failure_limit.reset(email_key)
+    if new_hash:
+        # Stored hash predates the current BCRYPT_ROUNDS; keep it if the password changed meanwhile
+        old_hash = user["passwordHash"]
+        update_record(USERS, user["id"], lambda u: {"passwordHash": new_hash} if u.get("passwordHash") == old_hash else None)
     token = create_access_token(identity=user["id"], additional_claims={"email": user["email"], "isAdmin": user["isAdmin"]})
     safe = {"id": user["id"], "name": user["name"], "email": user["email"], "isAdmin": user["isAdmin"]}
     return jsonify({"token": token, "user": safe})
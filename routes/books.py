@@ -1,5 +1,9 @@
 from flask import Blueprint, request, jsonify
-from data_store import get_books, save_books
+from data_store import BOOKS, get_books, get_record, insert_record, update_record, delete_record, page_records, index_values
+from utils.pagination import parse_limit, parse_sort, encode_cursor, decode_cursor
+from utils import search_index
+from utils.jobs import attach_book_text
+from utils.http_cache import cached_json
 import uuid
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request, get_jwt
 from functools import wraps
@@ -16,14 +20,56 @@ def admin_required(fn):
         return fn(*args, **kwargs)
     return wrapper
 
+LIST_PARAMS = ("limit", "cursor", "sort", "category", "q")
+SORT_FIELDS = {"title", "author", "price", "uploadedAt"}
+
 @books_bp.route("/", methods=["GET"])
 def list_books():
-    return jsonify(get_books())
+    # Without paging parameters keep returning the whole catalog as an array
+    if not any(p in request.args for p in LIST_PARAMS):
+        return cached_json([BOOKS], get_books)
+    try:
+        limit = parse_limit(request.args.get("limit"))
+        sort, descending = parse_sort(request.args.get("sort"), SORT_FIELDS, "uploadedAt")
+        after = decode_cursor(request.args.get("cursor"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    category = request.args.get("category")
+    q = (request.args.get("q") or "").strip().lower()
+    where = None
+    if q:
+        # Same matching the UI search box used to do client-side
+        def where(b):
+            text = f"{b.get('title')} {b.get('author')} {' '.join(b.get('categories') or [])}".lower()
+            return q in text
+
+    def page():
+        items, last = page_records(BOOKS, sort, after=after, limit=limit, descending=descending,
+                                   index=("categories", category) if category else None, where=where)
+        return {"items": items, "nextCursor": encode_cursor(last)}
+    return cached_json([BOOKS], page)
+
+@books_bp.route("/search", methods=["GET"])
+def search_books():
+    q = (request.args.get("q") or "").strip()
+    if not q: return jsonify({"error":"q required"}), 400
+    try:
+        limit = parse_limit(request.args.get("limit"), default=20)
+        offset = max(0, int(request.args.get("offset", 0)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    hits, total = search_index.index.search(q, limit=limit, offset=offset, category=request.args.get("category"))
+    results = [{"book": book, "score": round(score, 4), "snippet": search_index.snippet(book, q)} for score, book in hits]
+    return jsonify({"results": results, "total": total})
+
+@books_bp.route("/categories", methods=["GET"])
+def list_categories():
+    return jsonify(sorted(c for c in index_values(BOOKS, "categories") if isinstance(c, str)))
 
 @books_bp.route("/<id>", methods=["GET"])
 def get_book(id):
-    books = get_books()
-    book = next((b for b in books if b["id"]==id), None)
+    book = get_record(BOOKS, id)
     if not book: return jsonify({"error":"Book not found"}), 404
     return jsonify(book)
 
@@ -33,7 +79,6 @@ def create_book():
     data = request.get_json() or {}
     title = data.get("title"); author = data.get("author")
     if not title or not author: return jsonify({"error":"title and author required"}), 400
-    books = get_books()
     new = {
         "id": str(uuid.uuid4()),
         "title": title,
@@ -46,25 +91,22 @@ def create_book():
         "categories": data.get("categories", []),
         "uploadedAt": __import__("datetime").datetime.utcnow().isoformat()
     }
-    books.append(new); save_books(books)
+    insert_record(BOOKS, new)
+    if new["filename"]: attach_book_text(new)
     return jsonify(new), 201
 
 @books_bp.route("/<id>", methods=["PUT"])
 @jwt_required()
 def update_book(id):
-    books = get_books()
-    idx = next((i for i,b in enumerate(books) if b["id"]==id), None)
-    if idx is None: return jsonify({"error":"Book not found"}), 404
     data = request.get_json() or {}
-    books[idx].update(data)
-    save_books(books)
-    return jsonify(books[idx])
+    book = update_record(BOOKS, id, data)
+    if book is None: return jsonify({"error":"Book not found"}), 404
+    if "filename" in data: attach_book_text(book)
+    return jsonify(book)
 
 @books_bp.route("/<id>", methods=["DELETE"])
 @admin_required
 def delete_book(id):
-    books = get_books()
-    idx = next((i for i,b in enumerate(books) if b["id"]==id), None)
-    if idx is None: return jsonify({"error":"Book not found"}), 404
-    deleted = books.pop(idx); save_books(books)
+    deleted = delete_record(BOOKS, id)
+    if deleted is None: return jsonify({"error":"Book not found"}), 404
     return jsonify({"success": True, "deleted": deleted})
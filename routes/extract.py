@@ -1,25 +1,35 @@
-from flask import Blueprint, request, jsonify, current_app
-from utils.pdf_extract import extract_text_from_pdf_bytes
-from data_store import get_books
-import requests, io
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context, g
+from utils.pdf_extract import extract_text_cached, count_pdf_pages, parse_page_ranges, iter_pages_text_cached
+from utils.search_index import save_book_text
+from data_store import BOOKS, JOBS, get_record
+from utils.jobs import pending_job
+from utils import remote, s3
+from utils.remote import RemoteFileTooLarge
+import io, json
 from pathlib import Path
 from config import Config
 
 extract_bp = Blueprint("extract", __name__)
 
+# The book file stays open until the response is done, streamed pages included
+@extract_bp.teardown_request
+def _close_book_file(exc):
+    book_file = g.pop("book_file", None)
+    if book_file is not None:
+        book_file.close()
+
 @extract_bp.route("", methods=["POST"])
 def extract():
     data = request.get_json() or {}
     url = data.get("url")
     filename = data.get("filename")
     book_id = data.get("bookId")
+    book = None
     
     print(f"DEBUG: extract called with data: {data}")
 
     if book_id:
-        books = get_books()
-        print(f"DEBUG: found {len(books)} books in store")
-        book = next((b for b in books if b["id"] == book_id), None)
+        book = get_record(BOOKS, book_id)
         if book:
             filename = book.get("filename")
             print(f"DEBUG: resolved bookId {book_id} to filename {filename}")
@@ -38,21 +48,36 @@ def extract():
     if filename in demo_content:
         return jsonify({"text": demo_content[filename]})
 
-    pdf_bytes = None
+    # ?pages=10-20 extracts just those pages; ?stream=1 sends one NDJSON line per page
+    pages_spec = request.args.get("pages") or data.get("pages")
+    stream = request.args.get("stream") in ("1", "true") or bool(data.get("stream"))
+
+    # A page range is cheap enough to serve while the full extraction runs
+    job = pending_job(filename) if not url and not pages_spec else None
+    if job:
+        return jsonify({"status": job["status"], "jobId": job["id"], "message": "Text extraction in progress"}), 202
+
+    pdf = None
 
     if url:
         # fetch from HTTP (S3 or remote)
         try:
-            r = requests.get(url, timeout=30)
-            r.raise_for_status()
-            pdf_bytes = r.content
+            pdf = g.book_file = remote.fetch(url)
+        except RemoteFileTooLarge as e:
+            return jsonify({"error":"File too large", "details": str(e)}), 413
         except Exception as e:
             return jsonify({"error":"Failed to fetch URL", "details": str(e)}), 400
     elif filename:
         local = Path(Config.UPLOAD_FOLDER) / filename
-        if not local.exists():
+        if local.exists():
+            pdf = g.book_file = local.open("rb")
+        elif s3.ENABLED:
+            try:
+                pdf = g.book_file = s3.download(filename)
+            except Exception as e:
+                return jsonify({"error":"Failed to fetch file", "details": str(e)}), 400
+        if pdf is None:
             return jsonify({"error":"File not found"}), 404
-        pdf_bytes = local.read_bytes()
     else:
         return jsonify({"error":"Provide url or filename in body"}), 400
 
@@ -67,7 +92,10 @@ def extract():
     if filename in demo_content:
         return jsonify({"text": demo_content[filename]})
 
-    text = extract_text_from_pdf_bytes(pdf_bytes)
+    if pages_spec or stream:
+        return _extract_pages(pdf, pages_spec, stream)
+
+    text = extract_text_cached(pdf)
     
     # Fallback for demo books if extraction fails (or if file is dummy)
     if not text or len(text.strip()) < 10:
@@ -82,4 +110,34 @@ def extract():
         else:
             return jsonify({"text":"", "message":"No extractable text found (scanned PDF?)"})
 
+    # Keep the text so the book is searchable by content
+    if book:
+        save_book_text(book["id"], text)
     return jsonify({"text": text})
+
+def _extract_pages(pdf, pages_spec, stream):
+    try:
+        page_count = count_pdf_pages(pdf)
+    except Exception as e:
+        return jsonify({"error":"Not a readable PDF", "details": str(e)}), 400
+    try:
+        pages = parse_page_ranges(str(pages_spec), page_count) if pages_spec else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    chunks = iter_pages_text_cached(pdf, pages)
+    if not stream:
+        return jsonify({"pageCount": page_count, "pages": [{"page": n, "text": t} for n, t in chunks]})
+
+    def generate():
+        yield json.dumps({"pageCount": page_count}) + "\n"
+        for n, t in chunks:
+            yield json.dumps({"page": n, "text": t}) + "\n"
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+@extract_bp.route("/status/<job_id>", methods=["GET"])
+def job_status(job_id):
+    job = get_record(JOBS, job_id)
+    if not job: return jsonify({"error":"Job not found"}), 404
+    job.pop("claim", None)
+    return jsonify(job)
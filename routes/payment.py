@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from data_store import get_payments, save_payments, get_books
+from data_store import BOOKS, PAYMENTS, get_record, find_records, insert_record, update_record
+from utils import analytics, ledger
+from utils.idempotency import idempotent
 import uuid
 from datetime import datetime
 
@@ -8,6 +10,7 @@ payment_bp = Blueprint("payment", __name__)
 
 @payment_bp.route("/initiate", methods=["POST"])
 @jwt_required()
+@idempotent("payment-initiate")
 def initiate_payment():
     """Initiate a payment for a book"""
     data = request.get_json() or {}
@@ -21,8 +24,7 @@ def initiate_payment():
         return jsonify({"error": "Invalid payment method"}), 400
     
     # Get book details
-    books = get_books()
-    book = next((b for b in books if b["id"] == book_id), None)
+    book = get_record(BOOKS, book_id)
     if not book:
         return jsonify({"error": "Book not found"}), 404
     
@@ -40,9 +42,9 @@ def initiate_payment():
         "transactionId": None
     }
     
-    payments = get_payments()
-    payments.append(payment)
-    save_payments(payments)
+    with analytics.tracking() as changed:
+        insert_record(PAYMENTS, payment)
+        changed(None, payment)
     
     # In demo mode, return payment ID for frontend to "process"
     return jsonify({
@@ -54,6 +56,7 @@ def initiate_payment():
 
 @payment_bp.route("/verify", methods=["POST"])
 @jwt_required()
+@idempotent("payment-verify")
 def verify_payment():
     """Verify and complete a payment (demo mode - auto success)"""
     data = request.get_json() or {}
@@ -63,8 +66,7 @@ def verify_payment():
     if not payment_id:
         return jsonify({"error": "paymentId required"}), 400
     
-    payments = get_payments()
-    payment = next((p for p in payments if p["id"] == payment_id), None)
+    payment = get_record(PAYMENTS, payment_id)
     if not payment:
         return jsonify({"error": "Payment not found"}), 404
     
@@ -72,12 +74,27 @@ def verify_payment():
     if payment["userId"] != user_id:
         return jsonify({"error": "Unauthorized"}), 403
     
-    # Demo mode: Auto-approve payment
-    payment["status"] = "success"
-    payment["transactionId"] = transaction_id
-    payment["completedAt"] = datetime.utcnow().isoformat()
-    
-    save_payments(payments)
+    # Demo mode: Auto-approve payment. Only a pending payment moves to
+    # success, checked under the store's write lock, so concurrent verifies
+    # complete it once and a repeat returns the payment unchanged.
+    before = {}
+    def complete(current):
+        before.update(current)  # the version this update replaces, for the aggregates
+        if current.get("status") != "pending":
+            return None
+        return {
+            "status": "success",
+            "transactionId": transaction_id,
+            "completedAt": datetime.utcnow().isoformat()
+        }
+    with analytics.tracking() as changed:
+        payment = update_record(PAYMENTS, payment_id, complete)
+        if payment is not None and before.get("status") == "pending":
+            changed(before, payment)
+    if payment is None:
+        return jsonify({"error": "Payment not found"}), 404
+    if before.get("status") != "pending" and payment.get("status") != "success":
+        return jsonify({"error": f"Payment is {payment.get('status')}"}), 409
     
     return jsonify({
         "status": "success",
@@ -89,7 +106,11 @@ def verify_payment():
 def get_payment_history():
     """Get current user's payment history"""
     user_id = get_jwt_identity()
-    payments = get_payments()
-    
-    user_payments = [p for p in payments if p.get("userId") == user_id]
-    return jsonify(user_payments)
+    # Without query parameters keep returning every payment as an array
+    if not request.args:
+        return jsonify(find_records(PAYMENTS, "userId", user_id))
+    try:
+        query = ledger.parse_query(request.args, userId=user_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(ledger.page_response(query))
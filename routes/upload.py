@@ -1,15 +1,34 @@
 from flask import Blueprint, request, jsonify, current_app, url_for
-import os, uuid
+import os, uuid, math, shutil, tempfile, hashlib
 from config import Config
 from pathlib import Path
+from datetime import datetime, timedelta
+from data_store import UPLOADS, get_record, find_records, insert_record, update_record, delete_record
+from utils.jobs import enqueue_extraction
+from utils import s3
+from utils.file_serving import copy_and_hash, remember_etag
 
 upload_bp = Blueprint("upload", __name__)
 
-USE_S3 = bool(Config.S3_BUCKET and Config.AWS_ACCESS_KEY_ID and Config.AWS_SECRET_ACCESS_KEY)
+USE_S3 = s3.ENABLED
+
+# Request bodies are copied in chunks of this size, never read whole
+CHUNK_BYTES = 1024 * 1024
+# S3 allows at most 10000 parts per multipart upload
+MAX_PARTS = 10000
 
 if not os.path.exists(Config.UPLOAD_FOLDER):
     os.makedirs(Config.UPLOAD_FOLDER, exist_ok=True)
 
+def _new_key(filename):
+    ext = Path(filename).suffix
+    return f"{int(__import__('time').time()*1000)}-{uuid.uuid4()}{ext}"
+
+def _uploaded(key, storage):
+    # The bucket is private; /uploads/<key> redirects to a presigned GET
+    url = f"/uploads/{key}"
+    return {"filename": key, "url": url, "storage": storage, **_queue_extraction(key, storage)}
+
 @upload_bp.route("/", methods=["POST"])
 def upload_file():
     if "file" not in request.files:
@@ -18,20 +37,264 @@ def upload_file():
     if f.filename == "":
         return jsonify({"error":"No filename"}), 400
 
-    ext = Path(f.filename).suffix
-    key = f"{int(__import__('time').time()*1000)}-{uuid.uuid4()}{ext}"
+    key = _new_key(f.filename)
 
     if USE_S3:
-        import boto3
-        s3 = boto3.client("s3",
-            aws_access_key_id=Config.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=Config.AWS_SECRET_ACCESS_KEY,
-            region_name=Config.AWS_REGION)
-        s3.put_object(Bucket=Config.S3_BUCKET, Key=key, Body=f.read(), ContentType=f.mimetype)
-        url = f"https://{Config.S3_BUCKET}.s3.{Config.AWS_REGION}.amazonaws.com/{key}"
-        return jsonify({"filename": key, "url": url, "storage":"s3"})
+        from boto3.s3.transfer import TransferConfig
+        # Streams the spooled request file to S3 as a multipart upload, a few
+        # parts in parallel, so memory stays at parts x concurrency
+        transfer = TransferConfig(multipart_threshold=Config.UPLOAD_PART_BYTES,
+                                  multipart_chunksize=Config.UPLOAD_PART_BYTES,
+                                  max_concurrency=Config.UPLOAD_S3_CONCURRENCY)
+        s3.client().upload_fileobj(f.stream, Config.S3_BUCKET, key, ExtraArgs={"ContentType": f.mimetype}, Config=transfer)
+        return jsonify(_uploaded(key, "s3"))
     else:
         out = os.path.join(Config.UPLOAD_FOLDER, key)
-        f.save(out)
-        url = f"/uploads/{key}"
-        return jsonify({"filename": key, "url": url, "storage":"local"})
+        # Hash while saving so the file is served with its ETag right away
+        with open(out, "wb") as fh:
+            digest = copy_and_hash(f.stream, fh)
+        remember_etag(out, digest)
+        return jsonify(_uploaded(key, "local"))
+
+def _queue_extraction(key, storage):
+    # Extract PDFs in the background so readers never wait on parsing
+    if not key.lower().endswith(".pdf"):
+        return {}
+    job = enqueue_extraction(key, storage)
+    return {"jobId": job["id"]}
+
+# Direct uploads: POST /direct returns a presigned S3 PUT URL, the browser
+# uploads the file straight to the bucket, then POST /direct/complete
+# registers it. File bytes never pass through the app server.
+
+@upload_bp.route("/direct", methods=["POST"])
+def direct_upload():
+    if not USE_S3:
+        return jsonify({"error":"Direct uploads need S3 storage"}), 501
+    data = request.get_json() or {}
+    filename = data.get("filename") or ""
+    if not filename:
+        return jsonify({"error":"No filename"}), 400
+    content_type = data.get("contentType") or "application/octet-stream"
+    key = _new_key(filename)
+    return jsonify({
+        "filename": key,
+        "uploadUrl": s3.presigned_put(key, content_type),
+        "method": "PUT",
+        "headers": {"Content-Type": content_type},
+        "expiresIn": Config.S3_PRESIGN_SECONDS
+    })
+
+@upload_bp.route("/direct/complete", methods=["POST"])
+def direct_upload_complete():
+    if not USE_S3:
+        return jsonify({"error":"Direct uploads need S3 storage"}), 501
+    key = (request.get_json() or {}).get("filename") or ""
+    if not key or "/" in key:
+        return jsonify({"error":"filename required"}), 400
+    if s3.head(key) is None:
+        return jsonify({"error":"File has not been uploaded"}), 404
+    return jsonify(_uploaded(key, "s3"))
+
+@upload_bp.route("/url/<key>", methods=["GET"])
+def download_url(key):
+    """Short-lived presigned GET URL for reading a stored file from S3."""
+    if not USE_S3:
+        return jsonify({"url": f"/uploads/{key}", "storage":"local"})
+    return jsonify({"url": s3.presigned_get(key), "expiresIn": Config.S3_PRESIGN_SECONDS, "storage":"s3"})
+
+# Resumable uploads: POST /sessions, PUT /sessions/<id>/parts/<n> for each
+# part (in any order, retried as needed), then POST /sessions/<id>/complete.
+# GET /sessions/<id> lists the parts received so far, so a client can resume
+# after a dropped connection. Parts go straight to an S3 multipart upload, or
+# to a parts directory that is stitched together on completion.
+
+def _parts_dir(upload_id):
+    return Path(Config.UPLOAD_FOLDER) / ".parts" / upload_id
+
+def _part_count(session):
+    return max(1, math.ceil(session["size"] / session["partSize"]))
+
+def _part_size(session, n):
+    count = _part_count(session)
+    return session["size"] - (count - 1) * session["partSize"] if n == count else session["partSize"]
+
+def _session_view(session):
+    return {
+        "uploadId": session["id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "partSize": session["partSize"],
+        "parts": sorted(int(n) for n in session["parts"]),
+        "status": session["status"],
+        # Set once complete, for clients that missed the complete response
+        "result": session.get("result")
+    }
+
+def _discard(session):
+    """Drop whatever was stored for an unfinished upload."""
+    if session["storage"] == "s3":
+        try:
+            s3.client().abort_multipart_upload(Bucket=Config.S3_BUCKET, Key=session["key"], UploadId=session["s3UploadId"])
+        except Exception as e:
+            print(f"Abort multipart upload failed: {e}")
+    shutil.rmtree(_parts_dir(session["id"]), ignore_errors=True)
+    delete_record(UPLOADS, session["id"])
+
+def _expire_sessions():
+    now = datetime.utcnow()
+    cutoff = (now - timedelta(seconds=Config.UPLOAD_SESSION_TTL)).isoformat()
+    stale_claim = (now - timedelta(seconds=Config.UPLOAD_COMPLETE_TIMEOUT)).isoformat()
+    for session in find_records(UPLOADS, "status", "completing"):
+        # The request assembling it died; let the client complete it again
+        if session.get("claimedAt", "") < stale_claim:
+            claim = session.get("claim")
+            update_record(UPLOADS, session["id"], lambda s: {"status": "open"} if s.get("claim") == claim and s["status"] == "completing" else None)
+    for session in find_records(UPLOADS, "status", "open"):
+        if session["createdAt"] < cutoff:
+            _discard(session)
+    for session in find_records(UPLOADS, "status", "complete"):
+        if session["createdAt"] < cutoff:
+            delete_record(UPLOADS, session["id"])
+
+@upload_bp.route("/sessions", methods=["POST"])
+def create_session():
+    data = request.get_json() or {}
+    filename = data.get("filename") or ""
+    size = data.get("size")
+    if not filename:
+        return jsonify({"error":"No filename"}), 400
+    if not isinstance(size, int) or isinstance(size, bool) or size <= 0:
+        return jsonify({"error":"size must be a positive integer"}), 400
+    if math.ceil(size / Config.UPLOAD_PART_BYTES) > MAX_PARTS:
+        return jsonify({"error":"File too large"}), 413
+
+    _expire_sessions()
+    session = {
+        "id": str(uuid.uuid4()),
+        "key": _new_key(filename),
+        "filename": filename,
+        "size": size,
+        "partSize": Config.UPLOAD_PART_BYTES,
+        "contentType": data.get("contentType") or "application/octet-stream",
+        "storage": "s3" if USE_S3 else "local",
+        "parts": {},
+        "status": "open",
+        "createdAt": datetime.utcnow().isoformat()
+    }
+    if USE_S3:
+        created = s3.client().create_multipart_upload(Bucket=Config.S3_BUCKET, Key=session["key"], ContentType=session["contentType"])
+        session["s3UploadId"] = created["UploadId"]
+    insert_record(UPLOADS, session)
+    return jsonify(_session_view(session)), 201
+
+@upload_bp.route("/sessions/<upload_id>", methods=["GET"])
+def get_session(upload_id):
+    session = get_record(UPLOADS, upload_id)
+    if not session:
+        return jsonify({"error":"Upload not found"}), 404
+    return jsonify(_session_view(session))
+
+@upload_bp.route("/sessions/<upload_id>/parts/<int:n>", methods=["PUT"])
+def upload_part(upload_id, n):
+    session = get_record(UPLOADS, upload_id)
+    if not session:
+        return jsonify({"error":"Upload not found"}), 404
+    if session["status"] != "open":
+        return jsonify({"error":f"Upload is {session['status']}"}), 409
+    if not 1 <= n <= _part_count(session):
+        return jsonify({"error":"Part number out of range"}), 400
+    expected = _part_size(session, n)
+
+    # Spool the part to disk in chunks; it is only kept if it arrived whole
+    parts_dir = _parts_dir(upload_id)
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=parts_dir, suffix=".tmp")
+    try:
+        received = 0
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = request.stream.read(CHUNK_BYTES)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if received > expected:
+                    return jsonify({"error":f"Part {n} must be {expected} bytes"}), 413
+                out.write(chunk)
+        if received != expected:
+            return jsonify({"error":f"Part {n} is incomplete: got {received} of {expected} bytes"}), 400
+
+        etag = None
+        if session["storage"] == "s3":
+            with open(tmp, "rb") as body:
+                etag = s3.client().upload_part(Bucket=Config.S3_BUCKET, Key=session["key"], PartNumber=n,
+                                         UploadId=session["s3UploadId"], Body=body)["ETag"]
+        else:
+            os.replace(tmp, parts_dir / str(n))
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+    part = {"size": received, "etag": etag}
+    updated = update_record(UPLOADS, upload_id, lambda s: {"parts": {**s["parts"], str(n): part}} if s["status"] == "open" else None)
+    if updated is None:
+        # Aborted or expired while the part was arriving
+        shutil.rmtree(parts_dir, ignore_errors=True)
+        return jsonify({"error":"Upload not found"}), 404
+    if updated["parts"].get(str(n)) != part:
+        return jsonify({"error":f"Upload is {updated['status']}"}), 409
+    return jsonify({"part": n, **part})
+
+@upload_bp.route("/sessions/<upload_id>/complete", methods=["POST"])
+def complete_session(upload_id):
+    session = get_record(UPLOADS, upload_id)
+    if not session:
+        return jsonify({"error":"Upload not found"}), 404
+    missing = [n for n in range(1, _part_count(session) + 1) if str(n) not in session["parts"]]
+    if missing:
+        return jsonify({"error":"Missing parts", "missing": missing[:100]}), 400
+    # Only one request gets to assemble the file
+    token = uuid.uuid4().hex
+    claimed = update_record(UPLOADS, upload_id, lambda s: {"status": "completing", "claim": token, "claimedAt": datetime.utcnow().isoformat()}
+                            if s["status"] == "open" else None)
+    if claimed is None:
+        # Aborted or expired since it was read above
+        return jsonify({"error":"Upload not found"}), 404
+    if claimed.get("claim") != token:
+        return jsonify({"error":f"Upload is {claimed['status']}"}), 409
+
+    try:
+        if session["storage"] == "s3":
+            parts = [{"ETag": session["parts"][str(n)]["etag"], "PartNumber": n} for n in range(1, _part_count(session) + 1)]
+            s3.client().complete_multipart_upload(Bucket=Config.S3_BUCKET, Key=session["key"],
+                                            UploadId=session["s3UploadId"], MultipartUpload={"Parts": parts})
+        else:
+            out = Path(Config.UPLOAD_FOLDER) / session["key"]
+            tmp = out.with_name(f".{out.name}.tmp")
+            digest = hashlib.sha256()
+            with open(tmp, "wb") as fh:
+                for n in range(1, _part_count(session) + 1):
+                    with open(_parts_dir(upload_id) / str(n), "rb") as part:
+                        while chunk := part.read(CHUNK_BYTES):
+                            digest.update(chunk)
+                            fh.write(chunk)
+            os.replace(tmp, out)
+            remember_etag(out, digest.hexdigest())
+            shutil.rmtree(_parts_dir(upload_id), ignore_errors=True)
+    except Exception as e:
+        update_record(UPLOADS, upload_id, lambda s: {"status": "open"} if s.get("claim") == token else None)
+        return jsonify({"error":"Failed to complete upload", "details": str(e)}), 500
+
+    result = _uploaded(session["key"], session["storage"])
+    update_record(UPLOADS, upload_id, {"status": "complete", "result": result, "completedAt": datetime.utcnow().isoformat()})
+    return jsonify(result)
+
+@upload_bp.route("/sessions/<upload_id>", methods=["DELETE"])
+def abort_session(upload_id):
+    session = get_record(UPLOADS, upload_id)
+    if not session:
+        return jsonify({"error":"Upload not found"}), 404
+    if session["status"] == "complete":
+        return jsonify({"error":"Upload is complete"}), 409
+    _discard(session)
+    return jsonify({"message":"Upload aborted"})
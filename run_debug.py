@@ -15,19 +15,22 @@ logging.basicConfig(
     stream=sys.stdout
 )
 
-try:
-    from app import create_app
-    print("[OK] App imported")
+# Spawned PDF extraction workers import this script again; only the
+# real run starts the server
+if __name__ == "__main__":
+    try:
+        from app import create_app
+        print("[OK] App imported")
     
-    app = create_app()
-    print("[OK] App created")
-    print(f"[OK] Config PORT: {app.config['PORT']}")
+        app = create_app()
+        print("[OK] App created")
+        print(f"[OK] Config PORT: {app.config['PORT']}")
     
-    print("\n[OK] Starting Flask server...\n")
-    app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
+        print("\n[OK] Starting Flask server...\n")
+        app.run(host="0.0.0.0", port=5000, debug=False, threaded=True)
     
-except Exception as e:
-    print(f"\n[ERROR] FATAL: {e}")
-    import traceback
-    traceback.print_exc()
-    sys.exit(1)
+    except Exception as e:
+        print(f"\n[ERROR] FATAL: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
@@ -3,7 +3,11 @@ const app = {
     token: localStorage.getItem('celib_token'),
     user: null,
     books: [],
-    filteredBooks: [],
+    categories: [],
+    nextCursor: null,
+    loadingPage: false,
+    libraryRequest: 0,
+    directUploads: null,
     currentBook: null,
     theme: localStorage.getItem('celib_theme') || 'dark',
     fontSize: 100,
@@ -142,26 +146,87 @@ const app = {
   },
 
   // Library
+  // The server filters and pages the catalog; pages are appended as the
+  // sentinel below the grid scrolls into view.
+  LIBRARY_PAGE_SIZE: 24,
+
   refreshLibrary: async () => {
+    app.state.books = [];
+    app.state.nextCursor = null;
+    app.state.libraryRequest++;
+    app.loadCategories();
+    await app.loadNextPage(true);
+  },
+
+  loadCategories: async () => {
     try {
-      const res = await fetch('/api/books/', { headers: app.getHeaders() });
+      const res = await fetch('/api/books/categories', { headers: app.getHeaders() });
       if (res.ok) {
-        app.state.books = await res.json();
-        app.state.filteredBooks = app.state.books;
+        app.state.categories = await res.json();
         app.renderCategoryFilters();
-        app.renderLibrary();
       }
     } catch (e) { console.error(e); }
   },
 
-  renderLibrary: () => {
+  loadNextPage: async (first = false) => {
+    if (app.state.loadingPage && !first) return;
+    if (!first && !app.state.nextCursor) return;
+    const request = app.state.libraryRequest;
+    const params = new URLSearchParams({ limit: app.LIBRARY_PAGE_SIZE });
+    if (app.state.selectedCategory) params.set('category', app.state.selectedCategory);
+    // Text queries go to the ranked full-text search, which pages by offset
+    const searching = !!app.state.searchQuery;
+    if (searching) {
+      params.set('q', app.state.searchQuery);
+      params.set('offset', app.state.books.length);
+    } else if (app.state.nextCursor) {
+      params.set('cursor', app.state.nextCursor);
+    }
+
+    app.state.loadingPage = true;
+    try {
+      const url = searching ? `/api/books/search?${params}` : `/api/books/?${params}`;
+      const res = await fetch(url, { headers: app.getHeaders() });
+      // Ignore pages for a search the user has already replaced
+      if (!res.ok || request !== app.state.libraryRequest) return;
+      const page = await res.json();
+      if (searching) {
+        page.items = page.results.map(r => r.book);
+        const loaded = app.state.books.length + page.items.length;
+        page.nextCursor = loaded < page.total && page.items.length ? String(loaded) : null;
+      }
+      app.state.books = app.state.books.concat(page.items);
+      app.state.nextCursor = page.nextCursor;
+      app.renderLibrary(first ? app.state.books : page.items, !first);
+    } catch (e) {
+      console.error(e);
+    } finally {
+      if (request === app.state.libraryRequest) app.state.loadingPage = false;
+    }
+  },
+
+  observeLibraryEnd: () => {
     const grid = document.getElementById('libraryGrid');
-    if (!grid) return;
-    grid.innerHTML = '';
+    if (!grid || !('IntersectionObserver' in window)) return;
+    let sentinel = document.getElementById('librarySentinel');
+    if (!sentinel) {
+      sentinel = document.createElement('div');
+      sentinel.id = 'librarySentinel';
+      sentinel.style.height = '1px';
+      grid.after(sentinel);
+      new IntersectionObserver(entries => {
+        if (entries.some(e => e.isIntersecting)) app.loadNextPage();
+      }, { rootMargin: '400px' }).observe(sentinel);
+    }
+  },
 
-    const booksToRender = app.state.filteredBooks.length > 0 ? app.state.filteredBooks : app.state.books;
+  renderLibrary: (booksToRender = app.state.books, append = false) => {
+    const grid = document.getElementById('libraryGrid');
+    if (!grid) return;
+    app.observeLibraryEnd();
+    if (!append) grid.innerHTML = '';
 
-    if (booksToRender.length === 0) {
+    if (!append && booksToRender.length === 0) {
       grid.innerHTML = '<div style="grid-column: 1/-1; text-align:center; padding:60px; color:var(--text-muted);">No books found</div>';
       return;
     }
@@ -203,7 +268,8 @@ const app = {
   // Search and Filter Functions
   searchBooks: (query) => {
     app.state.searchQuery = query.toLowerCase();
-    app.applyFilters();
+    clearTimeout(app.searchTimer);
+    app.searchTimer = setTimeout(app.applyFilters, 250);
   },
 
   filterByCategory: (category) => {
@@ -222,42 +288,18 @@ const app = {
   },
 
   applyFilters: () => {
-    let filtered = app.state.books;
-
-    // Apply search filter
-    if (app.state.searchQuery) {
-      filtered = filtered.filter(book => {
-        const searchText = `${book.title} ${book.author} ${(book.categories || []).join(' ')}`.toLowerCase();
-        return searchText.includes(app.state.searchQuery);
-      });
-    }
-
-    // Apply category filter
-    if (app.state.selectedCategory) {
-      filtered = filtered.filter(book => {
-        return (book.categories || []).includes(app.state.selectedCategory);
-      });
-    }
-
-    app.state.filteredBooks = filtered;
-    app.renderLibrary();
-  },
-
-  extractCategories: () => {
-    const categoriesSet = new Set();
-    app.state.books.forEach(book => {
-      if (book.categories && Array.isArray(book.categories)) {
-        book.categories.forEach(cat => categoriesSet.add(cat));
-      }
-    });
-    return Array.from(categoriesSet).sort();
+    // Search text and category are applied server-side; restart paging
+    app.state.books = [];
+    app.state.nextCursor = null;
+    app.state.libraryRequest++;
+    app.loadNextPage(true);
   },
 
   renderCategoryFilters: () => {
     const container = document.getElementById('categoryFilters');
     if (!container) return;
 
-    const categories = app.extractCategories();
+    const categories = app.state.categories;
     if (categories.length === 0) {
       container.innerHTML = '';
       return;
@@ -354,15 +396,7 @@ const app = {
       const bookData = await createRes.json();
       if (!createRes.ok) throw new Error(bookData.error);
 
-      const fd = new FormData();
-      fd.append('file', file);
-      const upRes = await fetch('/api/upload', {
-        method: 'POST',
-        headers: app.getHeaders(),
-        body: fd
-      });
-      const upData = await upRes.json();
-      if (!upRes.ok) throw new Error(upData.error);
+      const upData = await app.uploadFile(file);
 
       const linkRes = await fetch(`/api/books/${bookData.id}`, {
         method: 'PUT',
@@ -383,6 +417,119 @@ const app = {
     } catch (e) { alert('Error: ' + e.message); }
   },
 
+  // Files above this size use the resumable, chunked upload API
+  CHUNKED_UPLOAD_THRESHOLD: 16 * 1024 * 1024,
+  UPLOAD_PARALLEL_PARTS: 3,
+
+  uploadFile: async (file) => {
+    if (app.state.directUploads !== false) {
+      const direct = await app.uploadDirect(file);
+      if (direct) return direct;
+    }
+    if (file.size > app.CHUNKED_UPLOAD_THRESHOLD) return app.uploadChunked(file);
+    const fd = new FormData();
+    fd.append('file', file);
+    const upRes = await fetch('/api/upload', {
+      method: 'POST',
+      headers: app.getHeaders(),
+      body: fd
+    });
+    const upData = await upRes.json();
+    if (!upRes.ok) throw new Error(upData.error);
+    return upData;
+  },
+
+  // Straight to S3 through a presigned URL; null when the server has no S3
+  uploadDirect: async (file) => {
+    const contentType = file.type || 'application/octet-stream';
+    const res = await fetch('/api/upload/direct', {
+      method: 'POST',
+      headers: { ...app.getHeaders(), 'Content-Type': 'application/json' },
+      body: JSON.stringify({ filename: file.name, contentType })
+    });
+    if (res.status === 501) {
+      app.state.directUploads = false;
+      return null;
+    }
+    const target = await res.json();
+    if (!res.ok) throw new Error(target.error);
+    const put = await fetch(target.uploadUrl, { method: target.method, headers: target.headers, body: file });
+    if (!put.ok) throw new Error(`Upload to storage failed (${put.status})`);
+    const doneRes = await fetch('/api/upload/direct/complete', {
+      method: 'POST',
+      headers: { ...app.getHeaders(), 'Content-Type': 'application/json' },
+      body: JSON.stringify({ filename: target.filename })
+    });
+    const data = await doneRes.json();
+    if (!doneRes.ok) throw new Error(data.error);
+    return data;
+  },
+
+  uploadChunked: async (file) => {
+    // Remember the session so a reload or dropped connection resumes it
+    const resumeKey = `celib_upload:${file.name}:${file.size}:${file.lastModified}`;
+    let session = null;
+    const savedId = localStorage.getItem(resumeKey);
+    if (savedId) {
+      const res = await fetch(`/api/upload/sessions/${savedId}`, { headers: app.getHeaders() });
+      if (res.ok) session = await res.json();
+      if (session && session.status === 'complete') {
+        localStorage.removeItem(resumeKey);
+        return session.result;
+      }
+      if (session && session.status !== 'open') session = null;
+    }
+    if (!session) {
+      const res = await fetch('/api/upload/sessions', {
+        method: 'POST',
+        headers: { ...app.getHeaders(), 'Content-Type': 'application/json' },
+        body: JSON.stringify({ filename: file.name, size: file.size, contentType: file.type })
+      });
+      session = await res.json();
+      if (!res.ok) throw new Error(session.error);
+      localStorage.setItem(resumeKey, session.uploadId);
+    }
+
+    const base = `/api/upload/sessions/${session.uploadId}`;
+    const received = new Set(session.parts);
+    const pending = [];
+    for (let n = 1; n <= Math.ceil(file.size / session.partSize); n++) {
+      if (!received.has(n)) pending.push(n);
+    }
+
+    const sendPart = async (n) => {
+      const blob = file.slice((n - 1) * session.partSize, Math.min(n * session.partSize, file.size));
+      for (let attempt = 0; ; attempt++) {
+        let res = null;
+        try {
+          res = await fetch(`${base}/parts/${n}`, {
+            method: 'PUT',
+            headers: { ...app.getHeaders(), 'Content-Type': 'application/octet-stream' },
+            body: blob
+          });
+        } catch (e) {
+          // Network error: retry below
+        }
+        if (res && res.ok) return;
+        if ((res && res.status < 500) || attempt >= 4) {
+          const data = res ? await res.json().catch(() => ({})) : {};
+          throw new Error(data.error || `Upload of part ${n} failed`);
+        }
+        await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** attempt));
+      }
+    };
+    const workers = Array.from({ length: Math.min(app.UPLOAD_PARALLEL_PARTS, pending.length) }, async () => {
+      while (pending.length) await sendPart(pending.shift());
+    });
+    await Promise.all(workers);
+
+    const res = await fetch(`${base}/complete`, { method: 'POST', headers: app.getHeaders() });
+    const data = await res.json();
+    if (!res.ok) throw new Error(data.error);
+    localStorage.removeItem(resumeKey);
+    return data;
+  },
+
   // PDF Reader with PDF.js
   openReader: async (book) => {
     console.log('Opening PDF reader for:', book.title);
@@ -582,6 +729,13 @@ const app = {
       });
       const data = await res.json();
 
+      if (res.status === 202) {
+        // The upload's text extraction is still running; retry once it is done
+        body.innerHTML = 'Preparing book text... <br><small>Summary will appear automatically.</small>';
+        await app.waitForJob(data.jobId);
+        return app.showSummary();
+      }
+
       if (res.ok) {
         let html = `
           <div style="margin-bottom:15px"><strong>Summary:</strong><br>${data.summary}</div>
@@ -611,6 +765,16 @@ const app = {
     }
   },
 
+  waitForJob: async (jobId) => {
+    for (;;) {
+      await new Promise(resolve => setTimeout(resolve, 2000));
+      const res = await fetch(`/api/extract/status/${jobId}`);
+      if (!res.ok) return;
+      const job = await res.json();
+      if (job.status !== 'queued' && job.status !== 'running') return;
+    }
+  },
+
   closeModal: (id) => {
     document.getElementById(id).classList.add('hidden');
   },
@@ -632,11 +796,11 @@ const app = {
         : 0;
       document.getElementById('statSuccessRate').textContent = `${successRate}%`;
 
-      // Load customers
-      const customersRes = await fetch('/api/admin/customers', {
+      // Load customers: the top spenders, one page
+      const customersRes = await fetch('/api/admin/customers?sort=-totalSpent&limit=100', {
         headers: app.getHeaders()
       });
-      const customers = await customersRes.json();
+      const customers = (await customersRes.json()).items;
 
       const tbody = document.getElementById('customersTableBody');
       tbody.innerHTML = customers.map(c => `
@@ -651,14 +815,14 @@ const app = {
         </tr>
       `).join('');
 
-      // Load payments
-      const paymentsRes = await fetch('/api/admin/payments', {
+      // Load recent payments: newest first, one page
+      const paymentsRes = await fetch('/api/admin/payments?limit=10', {
         headers: app.getHeaders()
       });
-      const payments = await paymentsRes.json();
+      const payments = (await paymentsRes.json()).items;
 
       const paymentsBody = document.getElementById('paymentsTableBody');
-      paymentsBody.innerHTML = payments.slice(0, 10).map(p => `
+      paymentsBody.innerHTML = payments.map(p => `
         <tr>
           <td>${new Date(p.createdAt).toLocaleDateString()}</td>
           <td>${p.userId.substring(0, 8)}...</td>
@@ -719,16 +883,39 @@ const app = {
     }
   },
 
+  // POST JSON under an Idempotency-Key, retrying network errors and 5xx
+  // responses with the same key: the server runs the request at most once
+  postIdempotent: async (url, body, key) => {
+    for (let attempt = 0; ; attempt++) {
+      let res = null;
+      try {
+        res = await fetch(url, {
+          method: 'POST',
+          headers: { ...app.getHeaders(), 'Content-Type': 'application/json', 'Idempotency-Key': key },
+          body: JSON.stringify(body)
+        });
+      } catch (e) {
+        // Network error: retry below
+      }
+      // 409: the first attempt is still running on the server
+      if (res && res.status < 500 && res.status !== 409) return res;
+      if (attempt >= 3) {
+        if (res) return res;
+        throw new Error('Network error');
+      }
+      await new Promise(resolve => setTimeout(resolve, 500 * 2 ** attempt));
+    }
+  },
+
   processPayment: async (method) => {
     const book = app.state.currentPaymentBook;
+    const attemptKey = window.crypto && crypto.randomUUID
+      ? crypto.randomUUID()
+      : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
 
     try {
       // Initiate payment
-      const initRes = await fetch('/api/payment/initiate', {
-        method: 'POST',
-        headers: { ...app.getHeaders(), 'Content-Type': 'application/json' },
-        body: JSON.stringify({ bookId: book.id, method })
-      });
+      const initRes = await app.postIdempotent('/api/payment/initiate', { bookId: book.id, method }, `initiate-${attemptKey}`);
 
       if (!initRes.ok) {
         throw new Error('Failed to initiate payment');
@@ -737,11 +924,7 @@ const app = {
       const { paymentId } = await initRes.json();
 
       // Verify payment (demo mode - auto success)
-      const verifyRes = await fetch('/api/payment/verify', {
-        method: 'POST',
-        headers: { ...app.getHeaders(), 'Content-Type': 'application/json' },
-        body: JSON.stringify({ paymentId })
-      });
+      const verifyRes = await app.postIdempotent('/api/payment/verify', { paymentId }, `verify-${paymentId}`);
 
       const result = await verifyRes.json();
 
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 import io
 import json
+import time
+from bench_pdf_extract import make_pdf
 from app import create_app
 
 app = create_app()
@@ -51,5 +53,26 @@ with app.test_client() as client:
     # Attempt to summarize via AI endpoint
     r = client.post('/api/ai/summarize', json={"bookId": book['id']}, headers=headers)
     print('SUMMARIZE', r.status_code, r.get_json())
+
+    # Summarize a real PDF: its upload queues an extraction job, and the
+    # summarizer then reads the text that job cached
+    data = {
+        'file': (io.BytesIO(make_pdf(3)), 'sample.pdf')
+    }
+    r = client.post('/api/upload/', data=data, content_type='multipart/form-data')
+    print('UPLOAD PDF', r.status_code, r.get_json())
+    if r.status_code != 200:
+        raise SystemExit('PDF upload failed')
+    r = client.put(f"/api/books/{book['id']}", json={'filename': r.get_json()['filename']}, headers=headers)
+    print('UPDATE BOOK', r.status_code)
+    deadline = time.monotonic() + 60
+    while True:
+        r = client.post('/api/ai/summarize', json={"bookId": book['id']}, headers=headers)
+        if r.status_code != 202 or time.monotonic() > deadline:
+            break
+        time.sleep(0.2)
+    print('SUMMARIZE PDF', r.status_code, r.get_json())
+    if r.status_code != 200 or not r.get_json().get('summary'):
+        raise SystemExit('Summarize of a PDF failed')
     
     print('\nE2E test complete')
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Summarizer tests against the offline stub model (GEMINI_MODEL=stub)."""
+
+import threading
+import time
+import uuid
+
+from config import Config
+from data_store import BOOKS, insert_record, delete_record
+from utils import llm, summary_cache
+from utils.summarizer import StubModel, summarize_text
+
+
+class SlowStubModel(StubModel):
+    """StubModel that takes a while per call, so concurrent requests overlap."""
+
+    def generate_content(self, prompt):
+        time.sleep(0.05)
+        return super().generate_content(prompt)
+
+
+def _stub(chunk_chars=2000):
+    """Point the summarizer at a fresh stub model with small sections."""
+    saved = (Config.GEMINI_MODEL, Config.SUMMARY_CHUNK_CHARS, llm._model)
+    Config.GEMINI_MODEL = "stub"
+    Config.SUMMARY_CHUNK_CHARS = chunk_chars
+    llm._model = SlowStubModel()
+    return saved
+
+
+def _restore(saved):
+    Config.GEMINI_MODEL, Config.SUMMARY_CHUNK_CHARS, llm._model = saved
+
+
+def test_map_reduce():
+    """A long text is summarized per section, then reduced; calls are cached."""
+    saved = _stub()
+    try:
+        model = StubModel()
+        text = "\n\n".join(f"Chapter {i} {uuid.uuid4().hex}. " + "It was a dark and stormy night. " * 40
+                           for i in range(12))
+        result = summarize_text(text, model)
+        assert result["sections"] > 1
+        assert result["summary"]
+        # one call per section, at least one reduce call
+        assert model.calls > result["sections"]
+        calls = model.calls
+        assert summarize_text(text, model) == result
+        assert model.calls == calls, "unchanged sections were summarized again"
+    finally:
+        _restore(saved)
+
+
+def test_cache_keyed_by_model():
+    """Summaries made with one GEMINI_MODEL are not served for another."""
+    saved = _stub()
+    try:
+        key = uuid.uuid4().hex
+        summary_cache.put(key, "gemini", {"summary": "from the stub"})
+        assert summary_cache.get(key, "gemini") == {"summary": "from the stub"}
+        Config.GEMINI_MODEL = "another-model"
+        assert summary_cache.get(key, "gemini") is None
+    finally:
+        _restore(saved)
+
+
+def test_single_flight():
+    """Concurrent summaries of one book run the model once; the rest wait for it."""
+    from app import create_app
+    saved = _stub()
+    book = insert_record(BOOKS, {"id": str(uuid.uuid4()), "title": "Single flight", "filename": "gatsby.pdf"})
+    try:
+        app = create_app()
+        with app.test_client() as client:
+            # refresh: ignore anything cached by earlier runs
+            r = client.post("/api/ai/summarize", json={"bookId": book["id"], "refresh": True})
+            assert r.status_code == 200, r.get_json()
+        one_run = llm._model.calls
+
+        llm._model = SlowStubModel()
+        start = threading.Barrier(4)
+        responses = []
+
+        def summarize():
+            with app.test_client() as client:
+                start.wait()
+                r = client.post("/api/ai/summarize", json={"bookId": book["id"], "refresh": True})
+                responses.append((r.status_code, r.get_json()))
+
+        threads = [threading.Thread(target=summarize) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert [status for status, _ in responses] == [200] * 4, responses
+        assert all(body["source"] == "gemini" for _, body in responses)
+        assert sorted(body["cached"] for _, body in responses) == [False, True, True, True]
+        assert llm._model.calls == one_run, "the model ran more than once"
+    finally:
+        delete_record(BOOKS, book["id"])
+        _restore(saved)
+
+
+if __name__ == "__main__":
+    for test in (test_map_reduce, test_cache_keyed_by_model, test_single_flight):
+        test()
+        print(f"✓ {test.__name__}")
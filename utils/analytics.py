@@ -0,0 +1,148 @@
+"""Payment aggregates for the admin dashboard, maintained as payments change.
+
+The ``analytics`` collection holds one record with running totals: counts by
+status and method, revenue, and per-day and per-book figures. Every payment
+write happens inside tracking(), which passes the payment before and after
+the change on to the record, so no request scans the payment history.
+
+tracking() and rebuild() hold the same lock (shared by both gunicorn
+workers), so a rebuild sees a payment write together with its delta or
+neither, and no delta is counted twice. The record notes the payments
+generation it reflects; current() rebuilds it when that no longer matches
+(a write that bypassed tracking()), when it is missing or when it was
+built by an older VERSION.
+"""
+
+import contextlib
+import json
+from collections import Counter
+
+from data_store import ANALYTICS, PAYMENTS, generation, get_payments, get_record, update_record, write
+from utils import locks
+
+RECORD_ID = "payments"
+# Change when the shape of the record or what a payment contributes changes
+VERSION = 2
+# Longest wait for another writer or rebuild before going on without the lock
+LOCK_SECONDS = 10
+
+
+def _contribution(payment):
+    """Counter of {(section, key, counter): amount} one payment adds."""
+    out = Counter()
+    if not payment:
+        return out
+    status = payment.get("status") or "unknown"
+    method = payment.get("method") or "unknown"
+    book = payment.get("bookId") or "unknown"
+    created = (payment.get("createdAt") or "")[:10]
+    out[("totals", "all", "transactions")] += 1
+    out[("status", status, "transactions")] += 1
+    out[("methods", method, "transactions")] += 1
+    out[("books", book, "transactions")] += 1
+    out[("days", created, "transactions")] += 1
+    if status == "success":
+        amount = payment.get("amount") or 0
+        # Revenue lands on the day the payment completed
+        completed = (payment.get("completedAt") or payment.get("createdAt") or "")[:10]
+        for key in (("totals", "all"), ("methods", method), ("books", book), ("days", completed)):
+            out[key + ("successful",)] += 1
+            out[key + ("revenue",)] += amount
+    return out
+
+
+def _apply(record, delta):
+    """Add ``delta`` to the record's counters; returns the changed sections."""
+    changes = {}
+    for (section, key, counter), amount in delta.items():
+        if not amount:
+            continue
+        entries = changes.setdefault(section, dict(record.get(section) or {}))
+        entry = entries[key] = dict(entries.get(key) or {})
+        value = round(entry.get(counter, 0) + amount, 2)
+        if value:
+            entry[counter] = value
+        else:
+            entry.pop(counter, None)
+        if not entry:
+            del entries[key]
+    return changes
+
+
+def _difference(before, after):
+    delta = _contribution(after)
+    delta.subtract(_contribution(before))
+    return Counter({key: amount for key, amount in delta.items() if amount})
+
+
+def _stamp():
+    # As stored in a record: JSON turns the JSON backend's tuples into lists
+    return json.loads(json.dumps(generation(PAYMENTS)))
+
+
+def _fresh(record):
+    return record is not None and record.get("version") == VERSION and record.get("generation") == _stamp()
+
+
+def rebuild(save=True):
+    """Recompute the record from every payment; call with the lock held when saving."""
+    stamp = _stamp()
+    delta = Counter()
+    for payment in get_payments():
+        delta.update(_contribution(payment))
+    record = {"id": RECORD_ID, "version": VERSION, "generation": stamp, **_apply({}, delta)}
+    if save:
+        # The collection only ever holds this record
+        write(ANALYTICS, [record])
+    return record
+
+
+@contextlib.contextmanager
+def tracking():
+    """
+    Wrap one payment write; yields changed(before, after), to be called
+    with the payment before and after the write (before=None for an insert).
+    """
+    with locks.single_flight("analytics", RECORD_ID, LOCK_SECONDS) as held:
+        stamp = _stamp()
+
+        def changed(before, after):
+            delta = _difference(before, after)
+
+            def apply(record):
+                # Out of step already (or no lock): leave it to current() to rebuild
+                if not held or record.get("version") != VERSION or record.get("generation") != stamp:
+                    return {"generation": None}
+                return {**_apply(record, delta), "generation": _stamp()}
+
+            update_record(ANALYTICS, RECORD_ID, apply)
+
+        yield changed
+
+
+def current():
+    """The aggregate record, rebuilt first if it is missing or out of step."""
+    record = get_record(ANALYTICS, RECORD_ID)
+    if _fresh(record):
+        return record
+    # Out of step can just mean a payment write is between its write and its delta
+    with locks.single_flight("analytics", RECORD_ID, LOCK_SECONDS) as held:
+        record = get_record(ANALYTICS, RECORD_ID)
+        if not _fresh(record):
+            record = rebuild(save=held)
+    return record
+
+
+def series(record, period="day", start=None, end=None):
+    """Per-day or per-month totals between ``start`` and ``end`` (inclusive, ISO dates)."""
+    width = 10 if period == "day" else 7
+    buckets = {}
+    for day, entry in record.get("days", {}).items():
+        if (start and day < start) or (end and day > end):
+            continue
+        bucket = buckets.setdefault(day[:width], Counter())
+        bucket.update(entry)
+    return [
+        {"period": key, "transactions": b["transactions"], "successful": b["successful"], "revenue": round(b["revenue"], 2)}
+        for key, b in sorted(buckets.items())
+    ]
@@ -0,0 +1,124 @@
+"""Serving stored book files: byte ranges, strong ETags and cache headers.
+
+PDF.js reads books with HTTP range requests, so the first page renders
+before the whole file has arrived. Responses carry a strong ETag (SHA-256 of
+the content), which If-None-Match and If-Range need. The hash is computed
+while a file is uploaded, or on first request, and kept in a sidecar file
+under .etags/ so it survives restarts. Upload keys (timestamp + uuid) are
+never reused for different content, so they are served as immutable.
+
+Under gunicorn both full and partial responses go out with sendfile: for a
+range the file is handed over positioned at its start, rather than copied
+through Werkzeug's Python-level range iterator.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from pathlib import Path
+
+from flask import abort, request, send_file
+from werkzeug.security import safe_join
+
+from data_store import atomic_write
+
+CHUNK_BYTES = 1024 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Keys made by routes/upload._new_key: <epoch ms>-<uuid4><ext>
+_upload_key = re.compile(r'^\d{13}-[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}(\.\w+)?$')
+
+_etags = {}  # path -> ((mtime_ns, size), digest)
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _signature(path):
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _sidecar(path):
+    path = Path(path)
+    return path.parent / ".etags" / path.name
+
+
+def copy_and_hash(src, dst):
+    """Copy file object ``src`` into ``dst`` in chunks; returns the SHA-256 hex digest."""
+    digest = hashlib.sha256()
+    while True:
+        chunk = src.read(CHUNK_BYTES)
+        if not chunk:
+            return digest.hexdigest()
+        digest.update(chunk)
+        dst.write(chunk)
+
+
+def remember_etag(path, digest):
+    """Record the content hash of a file that was just written."""
+    sig = _signature(path)
+    _etags[str(path)] = (sig, digest)
+    sidecar = _sidecar(path)
+    sidecar.parent.mkdir(exist_ok=True)
+    atomic_write(sidecar, f"{sig[0]} {sig[1]} {digest}")
+
+
+def content_etag(path):
+    """SHA-256 of the file, from memory, its sidecar, or hashed once."""
+    path = str(path)
+    sig = _signature(path)
+    cached = _etags.get(path)
+    if cached and cached[0] == sig:
+        return cached[1]
+    with _locks_guard:
+        lock = _locks.setdefault(path, threading.Lock())
+    # Concurrent range requests for a new file hash it only once
+    with lock:
+        cached = _etags.get(path)
+        if cached and cached[0] == sig:
+            return cached[1]
+        try:
+            mtime, size, digest = _sidecar(path).read_text().split()
+            if (int(mtime), int(size)) == sig:
+                _etags[path] = (sig, digest)
+                return digest
+        except (OSError, ValueError):
+            pass
+        with open(path, "rb") as fh:
+            digest = hashlib.file_digest(fh, "sha256").hexdigest()
+        remember_etag(path, digest)
+        return digest
+
+
+def send_book_file(directory, filename, mimetype=None):
+    """Send an uploaded file with range, conditional and cache handling."""
+    # Dot paths hold upload internals (.parts, .etags)
+    if any(part.startswith(".") for part in filename.split("/")):
+        abort(404)
+    path = safe_join(str(directory), filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=content_etag(path))
+    # PDF.js only switches to range loading when the server advertises it
+    response.accept_ranges = "bytes"
+    if _upload_key.match(os.path.basename(path)):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    if (response.status_code == 206 and response.content_range is not None
+            and request.environ.get("SERVER_SOFTWARE", "").startswith("gunicorn")
+            and file_wrapper is not None):
+        # gunicorn sendfile()s a file wrapper from the file's current offset
+        # for Content-Length bytes, which is exactly the requested range
+        response.response.close()
+        fh = open(path, "rb")
+        fh.seek(response.content_range.start)
+        response.response = file_wrapper(fh, CHUNK_BYTES)
+    return response
@@ -0,0 +1,119 @@
+"""Conditional and compressed JSON responses for the list endpoints.
+
+cached_json() tags a response with an ETag derived from the data store
+generations of the collections it is built from, plus the request's query
+string. A client that already holds that version gets 304 before the body is
+built or serialized. Bodies are kept for the most recent tags, so other
+clients fetching the same version don't pay for serialization either.
+
+init_app() compresses JSON responses above COMPRESS_MIN_BYTES with gzip, or
+brotli when the optional brotli package is installed and the client accepts
+it. The encoding is appended to the ETag, which stays strong per variant.
+"""
+
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request
+
+import data_store
+from config import Config
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+# Serialized bodies of recent versions: etag -> {encoding: bytes}
+_bodies = OrderedDict()
+_bodies_lock = threading.Lock()
+MAX_BODIES = 32
+
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def _compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, Config.COMPRESS_LEVEL, mtime=0)
+
+
+def _remember(etag, encoding, data):
+    with _bodies_lock:
+        if encoding != "identity" and etag not in _bodies:
+            return  # not a cached_json() body
+        entry = _bodies.setdefault(etag, {})
+        entry[encoding] = data
+        _bodies.move_to_end(etag)
+        while len(_bodies) > MAX_BODIES:
+            _bodies.popitem(last=False)
+
+
+def _recall(etag, encoding):
+    with _bodies_lock:
+        entry = _bodies.get(etag)
+        return entry.get(encoding) if entry else None
+
+
+def etag_for(*collections):
+    """Strong ETag for the current request over the given collections."""
+    state = [data_store.instance(), request.path, request.query_string.decode()]
+    state += [data_store.generation(c) for c in collections]
+    return hashlib.sha256(repr(state).encode()).hexdigest()[:24]
+
+
+def cached_json(collections, build, private=False):
+    """
+    JSON response for ``build()``, revalidated against ``collections``.
+
+    Returns 304 when If-None-Match names the current version; ``build`` is
+    only called when no stored body for that version exists.
+    """
+    tag = etag_for(*collections)
+    cache_control = "private, no-cache" if private else "no-cache"
+    # A 304 or stored body must not leak to a user who may not see it:
+    # callers authorize before calling, and the tag covers the query string.
+    held = [t for t in request.if_none_match.as_set(include_weak=True) if t.split("-")[0] == tag]
+    if held:
+        # Echo the variant (e.g. "<tag>-gzip") the client holds
+        response = current_app.response_class(status=304)
+        response.set_etag(held[0])
+    else:
+        body = _recall(tag, "identity")
+        if body is None:
+            body = current_app.json.dumps(build()).encode()
+            _remember(tag, "identity", body)
+        response = current_app.response_class(body, mimetype="application/json")
+        response.set_etag(tag)
+    response.headers["Cache-Control"] = cache_control
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def compress_response(response):
+    """after_request hook: compress sizeable JSON bodies the client accepts."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or response.mimetype != "application/json" or "Content-Encoding" in response.headers):
+        return response
+    response.vary.add("Accept-Encoding")
+    accepted = request.accept_encodings
+    encoding = next((e for e in ENCODINGS if accepted[e]), None)
+    if encoding is None or response.content_length is None or response.content_length < Config.COMPRESS_MIN_BYTES:
+        return response
+    tag = response.get_etag()[0]
+    data = _recall(tag, encoding) if tag else None
+    if data is None:
+        data = _compress(response.get_data(), encoding)
+        if tag:
+            _remember(tag, encoding, data)
+    response.set_data(data)
+    response.content_encoding = encoding
+    if tag:
+        response.set_etag(f"{tag}-{encoding}")
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -0,0 +1,99 @@
+"""Idempotency-Key support for JSON endpoints that create or change state.
+
+A client sends the same Idempotency-Key header on every retry of one
+logical request. The first attempt runs the endpoint and its response is
+stored in the ``idempotency`` collection for IDEMPOTENCY_TTL seconds; later
+attempts get that stored response back (with Idempotent-Replayed: true)
+without running the endpoint again. Attempts with the same key are handled
+one at a time across threads and gunicorn workers, so a retry racing the
+original waits for it instead of repeating it. Keys are scoped per endpoint
+and per user; reusing one for a different request body is rejected.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import current_app, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+from config import Config
+from data_store import IDEMPOTENCY, get_record, insert_record, prune, update_record
+from utils import locks
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+
+
+def _now():
+    return datetime.utcnow()
+
+
+def _expired(entry, now):
+    cutoff = (now - timedelta(seconds=Config.IDEMPOTENCY_TTL)).isoformat()
+    return entry.get("createdAt", "") < cutoff
+
+
+def _fingerprint():
+    body = request.get_json(silent=True)
+    data = json.dumps(body, sort_keys=True).encode() if body is not None else request.get_data()
+    return hashlib.sha256(data).hexdigest()
+
+
+def _replay(entry):
+    response = current_app.response_class(entry["body"], status=entry["status"], mimetype="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _store(id, response, fingerprint):
+    entry = {
+        "id": id,
+        "fingerprint": fingerprint,
+        "status": response.status_code,
+        "body": response.get_data(as_text=True),
+        "createdAt": _now().isoformat()
+    }
+    # Attempts with this key are serialized, so nobody inserts it meanwhile
+    if update_record(IDEMPOTENCY, id, entry) is None:
+        insert_record(IDEMPOTENCY, entry)
+    evict()
+
+
+def evict():
+    """Drop expired entries."""
+    prune(IDEMPOTENCY, "createdAt", cutoff=(_now() - timedelta(seconds=Config.IDEMPOTENCY_TTL)).isoformat())
+
+
+def idempotent(scope):
+    """
+    Honor an Idempotency-Key header on a JWT-protected JSON endpoint.
+
+    Requests without the header run as before. Responses with a 5xx status
+    are not stored, so those attempts can be retried under the same key.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return fn(*args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return jsonify({"error": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters"}), 400
+            id = hashlib.sha256(f"{scope}\0{get_jwt_identity()}\0{key}".encode()).hexdigest()
+            fingerprint = _fingerprint()
+            with locks.single_flight("idempotency", id, Config.IDEMPOTENCY_LOCK_SECONDS) as held:
+                if not held:
+                    return jsonify({"error": f"A request with this {HEADER} is still in progress"}), 409
+                entry = get_record(IDEMPOTENCY, id)
+                if entry is not None and not _expired(entry, _now()):
+                    if entry["fingerprint"] != fingerprint:
+                        return jsonify({"error": f"{HEADER} was already used for a different request"}), 422
+                    return _replay(entry)
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code < 500 and response.mimetype == "application/json":
+                    _store(id, response, fingerprint)
+                return response
+        return wrapper
+    return decorator
@@ -0,0 +1,193 @@
+"""Background text extraction queued at upload time.
+
+Jobs are records in the ``jobs`` collection, so the queue survives restarts
+and is shared by both gunicorn workers. Each worker runs one dispatcher
+thread that claims queued jobs with an atomic queued -> running update and
+hands them to a small thread pool. The extracted text goes to the text cache
+(keyed by content hash), so later /api/extract and /api/ai/summarize calls
+for the file are cache reads; page and word counts are stored on the job.
+
+While a job runs, its dispatcher refreshes the job's heartbeat; a running job
+whose heartbeat stops (its worker died) is queued again. Finished jobs are
+deleted JOB_RETENTION_SECONDS after they finish.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from config import Config
+from data_store import BOOKS, JOBS, find_records, insert_record, prune, update_record
+from utils import remote, s3, text_cache
+from utils.pdf_extract import cached_text, extract_text_cached, count_pdf_pages
+from utils.search_index import save_book_text
+
+_wake = threading.Event()
+_started_pid = None
+_start_lock = threading.Lock()
+
+# Jobs this process is running: id -> [claim token, monotonic time of last heartbeat]
+_running = {}
+_running_lock = threading.Lock()
+PURGE_INTERVAL = 60
+
+
+def _now():
+    return datetime.utcnow().isoformat()
+
+
+def enqueue_extraction(filename, storage="local"):
+    job = {
+        "id": str(uuid.uuid4()),
+        "type": "extract",
+        "filename": filename,
+        "storage": storage,
+        "status": "queued",
+        "createdAt": _now()
+    }
+    insert_record(JOBS, job)
+    _wake.set()
+    return job
+
+
+def latest_job(filename):
+    jobs = find_records(JOBS, "filename", filename) if filename else []
+    return jobs[-1] if jobs else None
+
+
+def pending_job(filename):
+    """The queued or running extraction for ``filename``, if any."""
+    job = latest_job(filename)
+    return job if job and job["status"] in ("queued", "running") else None
+
+
+def attach_book_text(book):
+    """Make a book searchable by content once its file has been extracted."""
+    job = latest_job(book.get("filename"))
+    if job and job.get("textKey"):
+        text = cached_text(job["textKey"])
+        if text:
+            save_book_text(book["id"], text)
+
+
+def _claim(job_id):
+    token = uuid.uuid4().hex
+    def claim(job):
+        if job["status"] != "queued":
+            return None
+        return {"status": "running", "startedAt": _now(), "claim": token}
+    job = update_record(JOBS, job_id, claim)
+    return job if job and job.get("claim") == token else None
+
+
+def _last_seen(job):
+    return job.get("heartbeatAt") or job.get("startedAt", "")
+
+
+def _requeue_stale():
+    """Put back jobs left running by a worker that died mid-extraction."""
+    cutoff = (datetime.utcnow() - timedelta(seconds=Config.JOB_STALE_SECONDS)).isoformat()
+    for job in find_records(JOBS, "status", "running"):
+        if _last_seen(job) < cutoff:
+            update_record(JOBS, job["id"], lambda j: {"status": "queued"} if j["status"] == "running" and _last_seen(j) < cutoff else None)
+
+
+def _heartbeat():
+    """Refresh the heartbeat of this process's running jobs that are due."""
+    now = time.monotonic()
+    with _running_lock:
+        due = [(id, entry) for id, entry in _running.items() if now - entry[1] >= Config.JOB_HEARTBEAT_SECONDS]
+    for id, entry in due:
+        entry[1] = now
+        token = entry[0]
+        update_record(JOBS, id, lambda j: {"heartbeatAt": _now()} if j["status"] == "running" and j.get("claim") == token else None)
+
+
+def purge_finished():
+    """Delete jobs that finished more than JOB_RETENTION_SECONDS ago."""
+    cutoff = (datetime.utcnow() - timedelta(seconds=Config.JOB_RETENTION_SECONDS)).isoformat()
+    return prune(JOBS, "finishedAt", cutoff=cutoff)
+
+
+def _open_file(job):
+    if job.get("url"):
+        return remote.fetch(job["url"])
+    if job.get("storage") == "s3":
+        # Read through the shared client: the bucket is private
+        pdf = s3.download(job["filename"])
+        if pdf is None:
+            raise FileNotFoundError(f"{job['filename']} is not in the bucket")
+        return pdf
+    return (Path(Config.UPLOAD_FOLDER) / job["filename"]).open("rb")
+
+
+def run_job(job):
+    try:
+        with _open_file(job) as pdf:
+            text = extract_text_cached(pdf)
+            result = {
+                "status": "done",
+                "pageCount": count_pdf_pages(pdf),
+                "wordCount": len(text.split()),
+                "textKey": text_cache.content_key(pdf) if text else None,
+                "finishedAt": _now()
+            }
+    except Exception as e:
+        text = ""
+        result = {"status": "failed", "error": str(e), "finishedAt": _now()}
+    # Unless the job was requeued meanwhile and another worker owns it now
+    update_record(JOBS, job["id"], lambda j: result if j.get("claim") == job.get("claim") else None)
+    if text:
+        for book in find_records(BOOKS, "filename", job["filename"]):
+            save_book_text(book["id"], text)
+
+
+def _dispatch():
+    pool = ThreadPoolExecutor(max_workers=Config.EXTRACT_WORKERS, thread_name_prefix="extract")
+    slots = threading.Semaphore(Config.EXTRACT_WORKERS)
+
+    def run(job):
+        with _running_lock:
+            _running[job["id"]] = [job["claim"], time.monotonic()]
+        try:
+            run_job(job)
+        finally:
+            with _running_lock:
+                _running.pop(job["id"], None)
+            slots.release()
+            _wake.set()
+
+    purged = None
+    while True:
+        _wake.wait(Config.JOB_POLL_SECONDS)
+        _wake.clear()
+        try:
+            _heartbeat()
+            _requeue_stale()
+            if purged is None or time.monotonic() - purged >= PURGE_INTERVAL:
+                purge_finished()
+                purged = time.monotonic()
+            for job in find_records(JOBS, "status", "queued"):
+                if not slots.acquire(blocking=False):
+                    break
+                claimed = _claim(job["id"])
+                if claimed is None:
+                    slots.release()
+                    continue
+                pool.submit(run, claimed)
+        except Exception as e:
+            print(f"Job dispatcher error: {e}")
+
+
+def start_worker():
+    """Start this process's dispatcher thread (once per process)."""
+    global _started_pid
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        _started_pid = os.getpid()
+    threading.Thread(target=_dispatch, name="job-dispatcher", daemon=True).start()
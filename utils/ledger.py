@@ -0,0 +1,123 @@
+"""Filtered, keyset-paginated queries over the payments collection.
+
+Shared by the admin ledger, its CSV/NDJSON export and a user's own payment
+history. The most selective indexed filter (userId, bookId, status, method)
+picks the index bucket to scan; a createdAt range bisects the sorted order
+instead of scanning it. Exports walk the same pages, so a download holds one
+page in memory at a time and is stable while payments keep arriving.
+"""
+
+import csv
+import io
+import json
+from datetime import date, timedelta
+
+from data_store import PAYMENTS, page_records
+from utils.pagination import decode_cursor, encode_cursor, parse_limit, parse_sort
+
+# Index tried first when several filters are given: the most selective
+INDEXED_FILTERS = ("userId", "bookId", "status", "method")
+SORT_FIELDS = {"createdAt", "completedAt", "amount"}
+EXPORT_FIELDS = ("id", "createdAt", "completedAt", "userId", "bookId", "amount", "method", "status", "transactionId")
+EXPORT_PAGE = 500
+
+
+def _day(value, name):
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be a date (YYYY-MM-DD)")
+
+
+def parse_query(args, **fixed):
+    """Filters, sort and cursor from request args; ``fixed`` filters override them.
+
+    Raises ValueError for malformed values.
+    """
+    filters = {f: args[f] for f in INDEXED_FILTERS if args.get(f)}
+    filters.update(fixed)
+    # from/to are whole days, to inclusive: stored as [start, stop) on createdAt
+    start = _day(args["from"], "from").isoformat() if args.get("from") else None
+    stop = (_day(args["to"], "to") + timedelta(days=1)).isoformat() if args.get("to") else None
+    sort, descending = parse_sort(args.get("sort"), SORT_FIELDS, "-createdAt")
+    return {
+        "filters": filters,
+        "start": start,
+        "stop": stop,
+        "sort": sort,
+        "descending": descending,
+        "after": decode_cursor(args.get("cursor")),
+        "limit": parse_limit(args.get("limit")),
+    }
+
+
+def page(query, after=None, limit=None):
+    """(payments, key of the last one or None) for one page of ``query``."""
+    filters = dict(query["filters"])
+    index = None
+    for field in INDEXED_FILTERS:
+        if field in filters:
+            index = (field, filters.pop(field))
+            break
+    start, stop = query["start"], query["stop"]
+    ranged = query["sort"] == "createdAt"
+
+    def where(p):
+        if any(p.get(f) != v for f, v in filters.items()):
+            return False
+        if ranged:
+            return True  # bounds applied by page_records
+        created = p.get("createdAt") or ""
+        return (start is None or created >= start) and (stop is None or created < stop)
+
+    filtered = filters or (not ranged and (start or stop))
+    return page_records(PAYMENTS, query["sort"], after=after if after is not None else query["after"],
+                        limit=limit or query["limit"], descending=query["descending"], index=index,
+                        where=where if filtered else None,
+                        start=start if ranged else None, stop=stop if ranged else None)
+
+
+def page_response(query):
+    items, last = page(query)
+    return {"items": items, "nextCursor": encode_cursor(last)}
+
+
+def _all(query):
+    after = query["after"]
+    while True:
+        items, after = page(query, after=after, limit=EXPORT_PAGE)
+        yield from items
+        if after is None:
+            return
+
+
+def _cell(value):
+    # Keep spreadsheets from evaluating client-supplied text as a formula
+    if isinstance(value, str) and value[:1] in ("=", "+", "-", "@"):
+        return "'" + value
+    return value
+
+
+def export_csv(query):
+    """CSV lines for every matching payment, header first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for payment in _all(query):
+        writer.writerow([_cell(payment.get(f)) for f in EXPORT_FIELDS])
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_ndjson(query):
+    """One JSON object per line for every matching payment."""
+    lines = []
+    for payment in _all(query):
+        lines.append(json.dumps(payment) + "\n")
+        if len(lines) == EXPORT_PAGE:
+            yield "".join(lines)
+            lines = []
+    yield "".join(lines)
@@ -0,0 +1,119 @@
+"""Shared Gemini client for the summarizer.
+
+The model is configured once per process and reused. Upstream calls are
+limited to GEMINI_CONCURRENCY at a time, each bounded by GEMINI_TIMEOUT and
+retried with exponential backoff on transient errors (rate limits,
+unavailability, timeouts). Every request gets an overall deadline of
+GEMINI_DEADLINE_SECONDS so retries never run into gunicorn's 120s worker
+timeout; waiting in single_flight() for another request's computation of
+the same book counts against it too.
+
+Set GEMINI_MODEL=stub to use the offline StubModel instead of the API.
+"""
+
+import contextlib
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from config import Config
+from utils import locks
+from utils.summarizer import StubModel
+
+_model = None
+_model_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(Config.GEMINI_CONCURRENCY)
+# Calls run here so they can be timed out; a slot is held until the call
+# really returns, so abandoned calls still count against the limit
+_calls = ThreadPoolExecutor(max_workers=Config.GEMINI_CONCURRENCY, thread_name_prefix="gemini")
+
+
+def enabled():
+    return bool(Config.GEMINI_API_KEY) or Config.GEMINI_MODEL == "stub"
+
+
+def _base_model():
+    global _model
+    with _model_lock:
+        if _model is None:
+            if Config.GEMINI_MODEL == "stub":
+                _model = StubModel()
+            else:
+                import google.generativeai as genai
+                genai.configure(api_key=Config.GEMINI_API_KEY)
+                _model = genai.GenerativeModel(Config.GEMINI_MODEL)
+        return _model
+
+
+def _transient(error):
+    if isinstance(error, (TimeoutError, FutureTimeout, ConnectionError)):
+        return True
+    try:
+        from google.api_core import exceptions
+    except ImportError:
+        return False
+    return isinstance(error, (exceptions.TooManyRequests, exceptions.ResourceExhausted,
+                              exceptions.ServiceUnavailable, exceptions.InternalServerError,
+                              exceptions.DeadlineExceeded))
+
+
+class Client:
+    """The shared model, seen through one request's deadline."""
+
+    def __init__(self, deadline=None):
+        self.deadline = deadline or time.monotonic() + Config.GEMINI_DEADLINE_SECONDS
+
+    def remaining(self):
+        """Seconds left before the deadline (0 once it has passed)."""
+        return max(0, self.deadline - time.monotonic())
+
+    def _remaining(self):
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("Gemini request deadline exceeded")
+        return remaining
+
+    def _attempt(self, model, prompt):
+        if not _slots.acquire(timeout=self._remaining()):
+            raise TimeoutError("Timed out waiting for a Gemini slot")
+        try:
+            future = _calls.submit(model.generate_content, prompt)
+        except BaseException:
+            _slots.release()
+            raise
+        future.add_done_callback(lambda f: _slots.release())
+        return future.result(timeout=min(Config.GEMINI_TIMEOUT, self._remaining()))
+
+    def generate_content(self, prompt):
+        model = _base_model()
+        for attempt in range(Config.GEMINI_RETRIES + 1):
+            try:
+                return self._attempt(model, prompt)
+            except Exception as e:
+                if attempt == Config.GEMINI_RETRIES or not _transient(e):
+                    raise
+                delay = min(2 ** attempt + random.random(), 16)
+                if delay >= self.deadline - time.monotonic():
+                    raise
+                print(f"Gemini call failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+
+def client():
+    return Client()
+
+
+@contextlib.contextmanager
+def single_flight(key, client):
+    """
+    Serialize work on ``key`` across threads and gunicorn workers. Re-check
+    the cache once inside; whoever ran first has usually filled it.
+
+    Waits at most until ``client``'s deadline, then raises TimeoutError so
+    the request can fall back instead of outliving the worker timeout.
+    """
+    with locks.single_flight("summarize", key, client.remaining()) as held:
+        if not held:
+            raise TimeoutError("Timed out waiting for another summary of this book")
+        yield
@@ -0,0 +1,66 @@
+"""Per-key locks shared by the threads of one process and the gunicorn workers."""
+
+import contextlib
+import threading
+import time
+import zlib
+
+from data_store import BASE
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks are per process only
+    fcntl = None
+
+STRIPES = 64
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def single_flight(name, key, timeout):
+    """
+    Serialize work on ``key``: threads of this process queue on a lock and
+    gunicorn workers on one of STRIPES lock files, data/<name>-<n>.lock.
+    Yields True once held, or False if another thread or worker still held
+    the key after ``timeout`` seconds in all (the caller decides whether to
+    go ahead).
+    """
+    deadline = time.monotonic() + timeout
+    with _flights_lock:
+        entry = _flights.setdefault((name, key), [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        if not entry[0].acquire(timeout=max(0, deadline - time.monotonic())):
+            yield False
+            return
+        try:
+            if fcntl is None:
+                yield True
+                return
+            path = BASE / "data" / f"{name}-{zlib.crc32(key.encode()) % STRIPES}.lock"
+            with open(path, "a") as fh:
+                # Poll rather than block so a stuck holder cannot outlast the timeout
+                while True:
+                    try:
+                        fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        held = True
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() > deadline:
+                            held = False
+                            break
+                        time.sleep(0.05)
+                try:
+                    yield held
+                finally:
+                    if held:
+                        fcntl.flock(fh, fcntl.LOCK_UN)
+        finally:
+            entry[0].release()
+    finally:
+        with _flights_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _flights[(name, key)]
@@ -0,0 +1,45 @@
+"""Cursor pagination helpers shared by the list endpoints."""
+
+import base64
+import json
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+
+def parse_limit(value, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    """Clamp a ``limit`` query parameter to 1..maximum."""
+    try:
+        limit = int(value) if value not in (None, "") else default
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    return max(1, min(limit, maximum))
+
+
+def parse_sort(value, allowed, default):
+    """Split ``sort`` ("field" or "-field") into (field, descending)."""
+    value = value or default
+    descending = value.startswith("-")
+    field = value.lstrip("-")
+    if field not in allowed:
+        raise ValueError(f"sort must be one of: {', '.join(sorted(allowed))}")
+    return field, descending
+
+
+def encode_cursor(key):
+    """Opaque cursor for the (sort key, id) of the last item on a page."""
+    if key is None:
+        return None
+    raw = json.dumps(key, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        sort_key, id = json.loads(raw)
+        return (tuple(sort_key), id)
+    except Exception:
+        raise ValueError("invalid cursor")
@@ -0,0 +1,107 @@
+"""Password hashing with bounded cost and concurrency.
+
+bcrypt runs in a small per-process pool of BCRYPT_WORKERS threads (it
+releases the GIL, so request threads keep being served meanwhile). At most
+BCRYPT_QUEUE further requests may wait for a thread; beyond that hash and
+verify raise Busy straight away and the endpoint answers 429, so a login
+storm cannot pile up behind the pool and starve other requests.
+
+New hashes use BCRYPT_ROUNDS. verify() reports when a stored hash was made
+with a different cost so the caller can store a fresh one, which moves
+existing users to a new cost as they log in.
+
+Wrong passwords are remembered for NEGATIVE_CACHE_SECONDS (as keyed HMACs of
+the attempt and the stored hash, never the password), so a client retrying
+the same wrong password does not cost another bcrypt run.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from config import Config
+
+
+class Busy(Exception):
+    """Every hashing slot is taken; the client should retry shortly."""
+
+
+_pool = ThreadPoolExecutor(max_workers=Config.BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_admission = threading.BoundedSemaphore(Config.BCRYPT_WORKERS + Config.BCRYPT_QUEUE)
+
+NEGATIVE_CACHE_MAX = 10_000
+_failures = OrderedDict()  # HMAC of (stored hash, attempt) -> time remembered
+_failures_lock = threading.Lock()
+_failure_secret = os.urandom(32)
+
+
+def _run(fn, *args):
+    if not _admission.acquire(blocking=False):
+        raise Busy()
+    try:
+        return _pool.submit(fn, *args).result()
+    finally:
+        _admission.release()
+
+
+def rounds(hashed):
+    """The cost a bcrypt hash was made with, or None if it is not one."""
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+def hash_password(password):
+    """bcrypt hash of ``password`` at BCRYPT_ROUNDS; raises Busy when saturated."""
+    salt = bcrypt.gensalt(Config.BCRYPT_ROUNDS)
+    return _run(bcrypt.hashpw, password.encode(), salt).decode()
+
+
+def _failure_key(password, hashed):
+    return hmac.new(_failure_secret, hashed.encode() + b"\0" + password.encode(), hashlib.sha256).digest()
+
+
+def _known_failure(key):
+    with _failures_lock:
+        at = _failures.get(key)
+        if at is None:
+            return False
+        if time.monotonic() - at > Config.NEGATIVE_CACHE_SECONDS:
+            del _failures[key]
+            return False
+        return True
+
+
+def _remember_failure(key):
+    with _failures_lock:
+        _failures[key] = time.monotonic()
+        _failures.move_to_end(key)
+        while len(_failures) > NEGATIVE_CACHE_MAX:
+            _failures.popitem(last=False)
+
+
+def verify(password, hashed):
+    """
+    (matches, replacement hash or None). The replacement is set when
+    ``hashed`` was made with another cost than BCRYPT_ROUNDS. Raises Busy
+    when saturated.
+    """
+    key = _failure_key(password, hashed)
+    if _known_failure(key):
+        return False, None
+    if not _run(bcrypt.checkpw, password.encode(), hashed.encode()):
+        _remember_failure(key)
+        return False, None
+    if rounds(hashed) == Config.BCRYPT_ROUNDS:
+        return True, None
+    try:
+        return True, hash_password(password)
+    except Busy:
+        return True, None  # rehash on a later login
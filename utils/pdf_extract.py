@@ -1,26 +1,222 @@
 """PDF text extraction utilities."""
 
 import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, Union
+from pdfminer.converter import TextConverter
 from pdfminer.high_level import extract_text_to_fp
 from pdfminer.layout import LAParams
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from config import Config
+from utils import text_cache
 
+# PDF content: bytes, or an open seekable binary file (read from the start)
+PdfSource = Union[bytes, BinaryIO]
 
-def extract_text_from_pdf_bytes(pdf_bytes: bytes) -> str:
+_pool = None
+_pool_size = 0
+_pool_lock = threading.Lock()
+
+
+def _source(pdf: PdfSource) -> BinaryIO:
+    if isinstance(pdf, (bytes, bytearray)):
+        return io.BytesIO(pdf)
+    pdf.seek(0)
+    return pdf
+
+
+def extract_text_from_pdf_bytes(pdf: PdfSource) -> str:
     """
     Extract text from PDF bytes using pdfminer.six.
     
     Args:
-        pdf_bytes: PDF file as bytes
+        pdf: PDF file as bytes or an open binary file
         
     Returns:
         Extracted text from PDF
     """
+    return _extract_text(pdf).strip()
+
+
+def _extract_text(pdf: PdfSource) -> str:
+    """Unstripped text: every page followed by a form feed, blank pages included."""
     try:
         output = io.StringIO()
-        extract_text_to_fp(io.BytesIO(pdf_bytes), output, laparams=LAParams())
+        extract_text_to_fp(_source(pdf), output, laparams=LAParams())
         text = output.getvalue()
         output.close()
-        return text.strip()
+        return text
+    except Exception as e:
+        print(f"PDF extraction error: {e}")
+        return ""
+
+
+def _extract_page_range(path: str, first: int, last: int) -> str:
+    """Worker: text of pages [first, last) exactly as extract_text_to_fp emits it."""
+    output = io.StringIO()
+    with open(path, "rb") as fh:
+        extract_text_to_fp(fh, output, laparams=LAParams(), page_numbers=range(first, last))
+    return output.getvalue()
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    global _pool, _pool_size
+    with _pool_lock:
+        if _pool is None or _pool_size != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # spawn: forking a threaded server process is not safe
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            _pool_size = workers
+        return _pool
+
+
+def extraction_workers() -> int:
+    return Config.PDF_EXTRACT_WORKERS or os.cpu_count() or 1
+
+
+def extract_text_parallel(pdf: PdfSource, workers: int = None) -> str:
+    """
+    Extract text by splitting the document into page ranges laid out in
+    separate processes, reassembled in order. The result is identical to
+    extract_text_from_pdf_bytes; documents under PDF_PARALLEL_MIN_PAGES, or
+    with a single worker configured, take the single-call path.
+
+    Args:
+        pdf: PDF file as bytes or an open binary file
+        workers: Number of worker processes (default: PDF_EXTRACT_WORKERS)
+
+    Returns:
+        Extracted text from PDF
+    """
+    return _extract_text_parallel(pdf, workers).strip()
+
+
+def _extract_text_parallel(pdf: PdfSource, workers: int = None) -> str:
+    workers = workers or extraction_workers()
+    try:
+        page_count = count_pdf_pages(pdf)
+    except Exception:
+        page_count = 0
+    if workers <= 1 or page_count < max(2, Config.PDF_PARALLEL_MIN_PAGES):
+        return _extract_text(pdf)
+
+    # Two ranges per worker keeps processes busy when pages vary in cost
+    chunks = min(page_count, workers * 2)
+    bounds = [page_count * i // chunks for i in range(chunks + 1)]
+    # Workers read the document from a temp file rather than each getting a pickled copy
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            shutil.copyfileobj(_source(pdf), fh)
+        pool = _get_pool(workers)
+        futures = [pool.submit(_extract_page_range, path, bounds[i], bounds[i + 1]) for i in range(chunks)]
+        return "".join(f.result() for f in futures)
     except Exception as e:
         print(f"PDF extraction error: {e}")
         return ""
+    finally:
+        os.unlink(path)
+
+
+def count_pdf_pages(pdf: PdfSource) -> int:
+    """Number of pages, without running layout analysis."""
+    return sum(1 for _ in PDFPage.get_pages(_source(pdf)))
+
+
+def cached_text(key):
+    """Cached text of the file with content hash ``key``, as extract_text_cached returns it."""
+    text = text_cache.get(key)
+    return None if text is None else text.strip()
+
+
+def extract_text_cached(pdf: PdfSource) -> str:
+    """
+    Same as extract_text_from_pdf_bytes, but served from the on-disk text
+    cache when the same file content has been extracted before.
+
+    The cache keeps the text unstripped, so its form feeds still mark every
+    page boundary for iter_pages_text_cached.
+    """
+    key = text_cache.content_key(pdf)
+    text = text_cache.get(key)
+    if text is None:
+        text = _extract_text_parallel(pdf)
+        # Failed extractions are not cached so a later attempt can retry
+        if text.strip():
+            text_cache.put(key, text)
+    return text.strip()
+
+
+def parse_page_ranges(spec: str, page_count: int) -> list:
+    """
+    Parse a 1-based page selection such as "10-20", "3", "1,4-6" or "5-".
+
+    Returns the sorted page numbers, clipped to the document.
+    """
+    pages = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, dash, end = part.partition("-")
+        try:
+            first = int(start) if start else 1
+            last = (int(end) if end else page_count) if dash else first
+        except ValueError:
+            raise ValueError(f"invalid page range: {part!r}")
+        if first < 1 or last < first:
+            raise ValueError(f"invalid page range: {part!r}")
+        pages.update(range(first, min(last, page_count) + 1))
+    return sorted(pages)
+
+
+def iter_pages_text(pdf: PdfSource, pages=None):
+    """
+    Yield (page_number, text) one page at a time, laying out only the
+    requested 1-based ``pages`` (all pages when None). Each page's text is
+    what extract_text_to_fp writes for it, as in the full-text extraction.
+    """
+    wanted = None if pages is None else {p - 1 for p in pages}
+    last = max(wanted, default=-1) if wanted is not None else None
+    output = io.StringIO()
+    resources = PDFResourceManager()
+    device = TextConverter(resources, output, laparams=LAParams())
+    interpreter = PDFPageInterpreter(resources, device)
+    try:
+        for index, page in enumerate(PDFPage.get_pages(_source(pdf))):
+            if last is not None and index > last:
+                break
+            if wanted is not None and index not in wanted:
+                continue
+            interpreter.process_page(page)
+            text = output.getvalue()
+            output.seek(0)
+            output.truncate()
+            yield index + 1, text.strip()
+    finally:
+        device.close()
+
+
+def iter_pages_text_cached(pdf: PdfSource, pages=None):
+    """
+    Like iter_pages_text, but answered from the cached full text when the
+    document has already been extracted (pdfminer ends every page with a
+    form feed, so the cached text splits back into pages).
+    """
+    text = text_cache.get(text_cache.content_key(pdf))
+    # Entries cached stripped lost the form feeds of blank edge pages
+    if text is None or not text.endswith("\f"):
+        yield from iter_pages_text(pdf, pages)
+        return
+    split = text.split("\f")
+    if pages is None:
+        pages = range(1, count_pdf_pages(pdf) + 1)
+    for n in pages:
+        yield n, split[n - 1].strip() if n - 1 < len(split) else ""
@@ -0,0 +1,50 @@
+"""Fixed-window request counters, kept in memory.
+
+Each gunicorn worker counts on its own, so with two workers a client may get
+up to twice the configured limit through; that is enough to blunt password
+guessing and login storms without a shared store on the login path.
+"""
+
+import threading
+import time
+
+
+class RateLimiter:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._counts = {}  # key -> [window start, count]
+        self._lock = threading.Lock()
+
+    def _entry(self, key, now):
+        entry = self._counts.get(key)
+        if entry is None or now - entry[0] >= self.window:
+            if len(self._counts) > 10_000:
+                self._prune(now)
+            entry = self._counts[key] = [now, 0]
+        return entry
+
+    def _prune(self, now):
+        for key in [k for k, (start, _) in self._counts.items() if now - start >= self.window]:
+            del self._counts[key]
+
+    def retry_after(self, key):
+        """Seconds until ``key`` may try again; 0 if it is under the limit."""
+        now = time.monotonic()
+        with self._lock:
+            start, count = self._entry(key, now)
+            return max(1, int(start + self.window - now)) if count >= self.limit else 0
+
+    def hit(self, key):
+        """Count one attempt for ``key``; returns retry_after() before it was counted."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entry(key, now)
+            if entry[1] >= self.limit:
+                return max(1, int(entry[0] + self.window - now))
+            entry[1] += 1
+            return 0
+
+    def reset(self, key):
+        with self._lock:
+            self._counts.pop(key, None)
@@ -0,0 +1,145 @@
+"""Fetching remote book files (S3 or any URL) over a shared HTTP session.
+
+A single requests.Session with a pooled adapter keeps connections alive
+between fetches instead of opening a new TCP/TLS connection each time.
+Bodies are streamed: a file over REMOTE_MAX_BYTES is refused as soon as that
+is known, and downloads past REMOTE_SPOOL_BYTES are spooled to a temp file
+rather than accumulated in memory. fetch() hands back that file (or the
+cached copy) open for reading, so callers never need the whole body in
+memory either. Responses carrying an ETag or
+Last-Modified header are kept in REMOTE_CACHE_DIR and revalidated with a
+conditional GET, so an unchanged file is not downloaded again. The cache is
+evicted least recently used past REMOTE_CACHE_MAX_BYTES.
+"""
+
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from config import Config
+from data_store import atomic_write
+
+CHUNK_BYTES = 64 * 1024
+
+
+class RemoteFileTooLarge(ValueError):
+    pass
+
+
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16,
+                       max_retries=Retry(total=2, connect=2, backoff_factor=0.5,
+                                         status_forcelist=(502, 503, 504), allowed_methods={"GET"}))
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+
+_lock = threading.Lock()
+
+
+def _paths(url):
+    key = hashlib.sha256(url.encode()).hexdigest()
+    base = Path(Config.REMOTE_CACHE_DIR)
+    return base / f"{key}.bin", base / f"{key}.json"
+
+
+def _cached_meta(body, meta):
+    try:
+        if body.exists():
+            return json.loads(meta.read_text())
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _too_large(size):
+    return RemoteFileTooLarge(f"Remote file is larger than {Config.REMOTE_MAX_BYTES} bytes ({size})")
+
+
+def fetch(url):
+    """
+    Body of ``url`` as a binary file open at its start, from the local cache
+    when it is still current. The caller closes it.
+    """
+    body, meta = _paths(url)
+    cached = _cached_meta(body, meta)
+    headers = {}
+    if cached:
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("lastModified"):
+            headers["If-Modified-Since"] = cached["lastModified"]
+
+    timeout = (Config.REMOTE_CONNECT_TIMEOUT, Config.REMOTE_READ_TIMEOUT)
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as r:
+        if r.status_code == 304 and cached:
+            if cached.get("size", 0) > Config.REMOTE_MAX_BYTES:
+                raise _too_large(cached["size"])
+            with contextlib.suppress(FileNotFoundError):
+                os.utime(body)  # mark as recently used
+                return open(body, "rb")
+            return fetch(url)  # evicted meanwhile; fetch unconditionally
+        r.raise_for_status()
+        length = r.headers.get("Content-Length")
+        if length and length.isdigit() and int(length) > Config.REMOTE_MAX_BYTES:
+            raise _too_large(int(length))
+
+        body.parent.mkdir(parents=True, exist_ok=True)
+        spool = tempfile.SpooledTemporaryFile(max_size=Config.REMOTE_SPOOL_BYTES, dir=body.parent)
+        try:
+            size = 0
+            for chunk in r.iter_content(CHUNK_BYTES):
+                size += len(chunk)
+                if size > Config.REMOTE_MAX_BYTES:
+                    raise _too_large(size)
+                spool.write(chunk)
+            validators = {"etag": r.headers.get("ETag"), "lastModified": r.headers.get("Last-Modified")}
+            if any(validators.values()):
+                spool.seek(0)
+                _store(body, meta, spool, {"url": url, "size": size, **validators})
+            spool.seek(0)
+            return spool
+        except BaseException:
+            spool.close()
+            raise
+
+
+def _store(body, meta, spool, info):
+    fd, tmp = tempfile.mkstemp(dir=body.parent, prefix=f".{body.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            shutil.copyfileobj(spool, fh, CHUNK_BYTES)
+        os.replace(tmp, body)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+    atomic_write(meta, json.dumps(info))
+    evict()
+
+
+def evict(max_bytes=None):
+    """Delete least recently used files until the cache fits in max_bytes."""
+    max_bytes = Config.REMOTE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _lock:
+        try:
+            with os.scandir(Config.REMOTE_CACHE_DIR) as it:
+                entries = [(e.stat().st_mtime_ns, e.stat().st_size, e.path) for e in it if e.name.endswith(".bin")]
+        except FileNotFoundError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            for victim in (path, path[:-4] + ".json"):
+                with contextlib.suppress(FileNotFoundError):
+                    os.unlink(victim)
+            total -= size
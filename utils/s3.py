@@ -0,0 +1,90 @@
+"""Object storage: one S3 client per process, downloads and presigned URLs.
+
+boto3 clients are thread-safe but slow to build (credential resolution,
+endpoint setup), so the client is created once per process and shared.
+The bucket is private: presigned URLs let browsers PUT uploads to and GET
+books from it directly, keeping file bytes off the app servers, and the
+server itself reads objects through the client. The bucket needs a CORS
+rule allowing PUT and GET from the site's origin for the browser side.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+
+from config import Config
+
+ENABLED = bool(Config.S3_BUCKET and Config.AWS_ACCESS_KEY_ID and Config.AWS_SECRET_ACCESS_KEY)
+
+_client = None
+_client_pid = None
+_lock = threading.Lock()
+
+
+def client():
+    """The shared S3 client, rebuilt after a fork."""
+    global _client, _client_pid
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            import boto3
+            from botocore.config import Config as BotoConfig
+            _client = boto3.client("s3",
+                aws_access_key_id=Config.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=Config.AWS_SECRET_ACCESS_KEY,
+                region_name=Config.AWS_REGION,
+                config=BotoConfig(signature_version="s3v4",
+                                  max_pool_connections=Config.S3_MAX_CONNECTIONS,
+                                  retries={"max_attempts": 3, "mode": "standard"}))
+            _client_pid = os.getpid()
+        return _client
+
+
+def presigned_put(key, content_type, expires=None):
+    """URL the browser can PUT the file to; it must send the same Content-Type."""
+    return client().generate_presigned_url("put_object",
+        Params={"Bucket": Config.S3_BUCKET, "Key": key, "ContentType": content_type},
+        ExpiresIn=expires or Config.S3_PRESIGN_SECONDS, HttpMethod="PUT")
+
+
+def presigned_get(key, expires=None, content_type=None):
+    params = {"Bucket": Config.S3_BUCKET, "Key": key}
+    if content_type:
+        params["ResponseContentType"] = content_type
+    return client().generate_presigned_url("get_object", Params=params,
+        ExpiresIn=expires or Config.S3_PRESIGN_SECONDS)
+
+
+def download(key):
+    """
+    Object ``key`` as a binary file open at its start (spooled to disk past
+    REMOTE_SPOOL_BYTES), or None if it does not exist. The caller closes it.
+    """
+    from botocore.exceptions import ClientError
+    try:
+        body = client().get_object(Bucket=Config.S3_BUCKET, Key=key)["Body"]
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    spool = tempfile.SpooledTemporaryFile(max_size=Config.REMOTE_SPOOL_BYTES)
+    try:
+        shutil.copyfileobj(body, spool, 64 * 1024)
+    except BaseException:
+        spool.close()
+        raise
+    finally:
+        body.close()
+    spool.seek(0)
+    return spool
+
+
+def head(key):
+    """Object metadata, or None if it does not exist."""
+    from botocore.exceptions import ClientError
+    try:
+        return client().head_object(Bucket=Config.S3_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
@@ -0,0 +1,211 @@
+"""Full-text search over book metadata and extracted PDF text.
+
+An in-memory inverted index (term -> {book id: weighted term frequency})
+ranked with BM25. Extracted body text is kept in data/fulltext/<book id>.txt
+so every worker can index it. Before each query the index is synced against
+the books collection and that directory: only books whose metadata or text
+changed are re-tokenized, so uploads and edits are picked up incrementally,
+including those made by the other gunicorn worker.
+"""
+
+import heapq
+import html
+import math
+import os
+import re
+import threading
+
+import data_store
+from data_store import BOOKS
+
+TEXT_DIR = data_store.BASE / "data" / "fulltext"
+
+# Only the start of very long books is indexed, to bound memory per book
+BODY_CHARS = 200_000
+
+FIELD_WEIGHTS = {"title": 3, "author": 2, "categories": 2, "description": 1, "body": 1}
+
+K1 = 1.2
+B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his i in into is it its
+not of on or she that the their them then there they this to was were which
+will with you your
+""".split())
+
+_word = re.compile(r"\w+")
+
+
+def stem(word):
+    """Light suffix-stripping stemmer (plural, -ing, -ed, -ly and a few more)."""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    for suffix, repl in (("ational", "ate"), ("ization", "ize"), ("fulness", "ful"),
+                         ("ousness", "ous"), ("iveness", "ive"), ("ement", ""),
+                         ("ment", ""), ("ness", ""), ("ies", "y"), ("sses", "ss"),
+                         ("ing", ""), ("edly", ""), ("ed", ""), ("ly", "")):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[: len(word) - len(suffix)] + repl
+            break
+    else:
+        if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+            word = word[:-1]
+    # hopping -> hop, stopped -> stop
+    if len(word) > 3 and word[-1] == word[-2] and word[-1] not in "lsz":
+        word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    return [stem(w) for w in _word.findall(text.lower()) if len(w) > 1 and w not in STOPWORDS]
+
+
+def text_path(book_id):
+    book_id = str(book_id)
+    # Ids come from requests too; never let one name a file outside TEXT_DIR
+    if not book_id or ".." in book_id or "/" in book_id or "\\" in book_id:
+        raise ValueError(f"invalid book id: {book_id!r}")
+    return TEXT_DIR / f"{book_id}.txt"
+
+
+def save_book_text(book_id, text):
+    """Persist extracted body text so the book becomes searchable by content."""
+    if not book_id or not text:
+        return
+    TEXT_DIR.mkdir(parents=True, exist_ok=True)
+    data_store.atomic_write(text_path(book_id), text[:BODY_CHARS])
+
+
+def load_book_text(book_id):
+    try:
+        return text_path(book_id).read_text()
+    except FileNotFoundError:
+        return ""
+
+
+class SearchIndex:
+    def __init__(self):
+        self.postings = {}  # term -> {book id: weighted tf}
+        self.docs = {}  # book id -> (signature, {term: tf}, length)
+        self.books = {}
+        self.total_length = 0
+        self.token = None
+        self._lock = threading.Lock()
+
+    def _text_mtimes(self):
+        try:
+            with os.scandir(TEXT_DIR) as it:
+                return {e.name[:-4]: e.stat().st_mtime_ns for e in it if e.name.endswith(".txt")}
+        except FileNotFoundError:
+            return {}
+
+    def _dir_token(self):
+        try:
+            return TEXT_DIR.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def sync(self):
+        """Bring the index up to date; cheap when nothing changed."""
+        token = (data_store.generation(BOOKS), self._dir_token())
+        if token == self.token:
+            return
+        books = {b["id"]: b for b in data_store.get_books()}
+        mtimes = self._text_mtimes()
+        for id in list(self.docs):
+            if id not in books:
+                self._remove(id)
+        for id, book in books.items():
+            signature = (book.get("title"), book.get("author"), book.get("description"),
+                         tuple(book.get("categories") or ()), mtimes.get(id))
+            doc = self.docs.get(id)
+            if doc is None or doc[0] != signature:
+                self._remove(id)
+                self._add(id, book, signature)
+        self.books = books
+        self.token = token
+
+    def _add(self, id, book, signature):
+        fields = {
+            "title": book.get("title") or "",
+            "author": book.get("author") or "",
+            "categories": " ".join(c for c in book.get("categories") or [] if isinstance(c, str)),
+            "description": book.get("description") or "",
+            "body": load_book_text(id) if signature[-1] is not None else "",
+        }
+        tf = {}
+        for field, text in fields.items():
+            weight = FIELD_WEIGHTS[field]
+            for term in tokenize(text):
+                tf[term] = tf.get(term, 0) + weight
+        length = sum(tf.values())
+        for term, freq in tf.items():
+            self.postings.setdefault(term, {})[id] = freq
+        self.docs[id] = (signature, tf, length)
+        self.total_length += length
+
+    def _remove(self, id):
+        doc = self.docs.pop(id, None)
+        if doc is None:
+            return
+        for term in doc[1]:
+            bucket = self.postings.get(term)
+            if bucket is not None:
+                bucket.pop(id, None)
+                if not bucket:
+                    del self.postings[term]
+        self.total_length -= doc[2]
+
+    def search(self, query, limit=20, offset=0, category=None):
+        """BM25-ranked [(score, book)] and the total number of matches."""
+        with self._lock:
+            self.sync()
+            terms = set(tokenize(query))
+            n = len(self.docs)
+            if not terms or not n:
+                return [], 0
+            avg = self.total_length / n
+            scores = {}
+            for term in terms:
+                bucket = self.postings.get(term)
+                if not bucket:
+                    continue
+                idf = math.log(1 + (n - len(bucket) + 0.5) / (len(bucket) + 0.5))
+                for id, freq in bucket.items():
+                    length = self.docs[id][2]
+                    scores[id] = scores.get(id, 0.0) + idf * freq * (K1 + 1) / (freq + K1 * (1 - B + B * length / avg))
+            if category:
+                scores = {id: s for id, s in scores.items() if category in (self.books[id].get("categories") or [])}
+            top = heapq.nlargest(offset + limit, scores.items(), key=lambda kv: (kv[1], kv[0]))[offset:]
+            return [(score, dict(self.books[id])) for id, score in top], len(scores)
+
+
+def _until(matches, end):
+    for m in matches:
+        if m.end() > end:
+            return
+        yield m
+
+
+def snippet(book, query, width=160):
+    """HTML-escaped excerpt around the first query hit, hits wrapped in <mark>."""
+    terms = set(tokenize(query))
+    for text in (book.get("description") or "", load_book_text(book["id"])):
+        hits = (m for m in _word.finditer(text) if stem(m.group().lower()) in terms)
+        first = next(hits, None)
+        if first is None:
+            continue
+        start = max(0, first.start() - width // 2)
+        end = min(len(text), start + width)
+        out, pos = [], start
+        for m in (first, *_until(hits, end)):
+            out.append(html.escape(text[pos:m.start()]))
+            out.append(f"<mark>{html.escape(m.group())}</mark>")
+            pos = m.end()
+        out.append(html.escape(text[pos:end]))
+        return ("…" if start else "") + " ".join("".join(out).split()) + ("…" if end < len(text) else "")
+    return html.escape((book.get("description") or "")[:width])
+
+
+index = SearchIndex()
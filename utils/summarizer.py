@@ -0,0 +1,198 @@
+"""Map-reduce summarization of book-length texts with an LLM.
+
+The text is cut into sections of at most SUMMARY_CHUNK_CHARS. Each section
+is summarized concurrently on a shared, bounded thread pool (map), then the
+section summaries are combined into the final summary (reduce), in several
+rounds if they do not fit in one prompt. Section boundaries are chosen by
+content rather than position, and every section result is cached by the
+hash of its text, so re-summarizing an edited book only recomputes the
+sections that changed.
+
+A model is anything with ``generate_content(prompt)`` returning an object
+with a ``.text`` attribute, such as a Gemini GenerativeModel or StubModel.
+"""
+
+import hashlib
+import json
+import re
+import threading
+import zlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from config import Config
+from utils import summary_cache
+
+SECTION_PROMPT = """
+Summarize the following section of a book.
+
+Text:
+<<<
+{text}
+>>>
+
+Format the output as JSON with keys: summary (max 150 words), keywords (list of strings), characters (list of strings), categories (list of strings).
+"""
+
+FINAL_PROMPT = """
+Analyze the following {what} and provide a structured summary.
+
+Text:
+<<<
+{text}
+>>>
+
+Please provide:
+1. A concise summary (max 200 words).
+2. Key takeaways or themes (bullet points).
+3. Main characters (if applicable).
+4. Book genre/categories (e.g., Fiction, Romance, Mystery, Fantasy, etc.) - provide 1-3 categories.
+
+Format the output as JSON with keys: summary, keywords (list of strings), characters (list of strings), categories (list of strings).
+"""
+
+_pool = None
+_pool_lock = threading.Lock()
+
+_paragraph_break = re.compile(r'\n\s*\n|\f')
+_sentence_break = re.compile(r'(?<=[.!?])\s+')
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=Config.SUMMARY_WORKERS, thread_name_prefix="summarize")
+        return _pool
+
+
+def parse_json(content):
+    """JSON object from a model reply, with or without a markdown code block."""
+    if "```json" in content:
+        content = content.split("```json")[1].split("```")[0]
+    elif "```" in content:
+        content = content.split("```")[1].split("```")[0]
+    return json.loads(content)
+
+
+def _hard_split(paragraph, size):
+    """Pieces of at most ``size`` chars, cut at sentence ends where possible."""
+    pieces, current = [], ""
+    for sentence in _sentence_break.split(paragraph):
+        while len(sentence) > size:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:size])
+            sentence = sentence[size:]
+        if current and len(current) + len(sentence) + 1 > size:
+            pieces.append(current)
+            current = ""
+        current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_sections(text, size=None):
+    """
+    Split text into sections of at most ``size`` chars at paragraph breaks.
+
+    Past half the size a section ends after any paragraph whose checksum picks
+    it as a boundary, so boundaries depend on nearby content only and an edit
+    leaves the sections before and after it unchanged.
+    """
+    size = size or Config.SUMMARY_CHUNK_CHARS
+    sections, current = [], []
+    length = 0
+    for paragraph in _paragraph_break.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        for piece in _hard_split(paragraph, size) if len(paragraph) > size else [paragraph]:
+            if current and length + len(piece) > size:
+                sections.append("\n\n".join(current))
+                current, length = [], 0
+            current.append(piece)
+            length += len(piece) + 2
+            if length >= size // 2 and zlib.crc32(piece.encode()) % 8 == 0:
+                sections.append("\n\n".join(current))
+                current, length = [], 0
+    if current:
+        sections.append("\n\n".join(current))
+    return sections
+
+
+def _call(model, prompt, refresh=False):
+    """Cached model call; the key covers the prompt, so any input change misses."""
+    key = hashlib.sha256(prompt.encode()).hexdigest()
+    result = None if refresh else summary_cache.get(key, "gemini-section")
+    if result is None:
+        result = parse_json(model.generate_content(prompt).text)
+        summary_cache.put(key, "gemini-section", result)
+    return result
+
+
+def _map(model, prompts, refresh):
+    pool = _executor()
+    return [f.result() for f in [pool.submit(_call, model, p, refresh) for p in prompts]]
+
+
+def _format(summaries):
+    return "\n\n".join(f"Section {i}: {s.get('summary') or ''}" for i, s in enumerate(summaries, 1))
+
+
+def summarize_text(text, model, refresh=False):
+    """
+    Summarize a whole book with ``model``; ``refresh`` skips cached calls.
+
+    Returns a dict with summary, keywords, characters, categories,
+    reading_minutes (from the word count of the full text) and sections.
+    """
+    size = Config.SUMMARY_CHUNK_CHARS
+    sections = split_sections(text, size)
+    if len(sections) <= 1:
+        result = _call(model, FINAL_PROMPT.format(what="text from a book", text=text.strip()), refresh)
+    else:
+        summaries = _map(model, [SECTION_PROMPT.format(text=s) for s in sections], refresh)
+        # Reduce in rounds until the section summaries fit in one prompt
+        while len(_format(summaries)) > size and len(summaries) > 1:
+            groups, group = [], []
+            for s in summaries:
+                if group and len(_format(group + [s])) > size:
+                    groups.append(group)
+                    group = []
+                group.append(s)
+            groups.append(group)
+            summaries = _map(model, [SECTION_PROMPT.format(text=_format(g)) for g in groups], refresh)
+        what = "summaries of consecutive sections of a book, in order"
+        result = _call(model, FINAL_PROMPT.format(what=what, text=_format(summaries)), refresh)
+    return {
+        "summary": result.get("summary"),
+        "keywords": result.get("keywords", []),
+        "reading_minutes": max(1, len(text.split())//200),
+        "characters": result.get("characters", []),
+        "categories": result.get("categories", ["General"]),
+        "sections": len(sections)
+    }
+
+
+class StubModel:
+    """Offline stand-in for a Gemini model: extractive answers, counted calls."""
+
+    def __init__(self):
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt):
+        with self._lock:
+            self.calls += 1
+        text = prompt.split("<<<\n", 1)[1].rsplit("\n>>>", 1)[0]
+        words = [w for w in re.findall(r'\w+', text.lower()) if len(w) > 3]
+        reply = {
+            "summary": " ".join(_sentence_break.split(" ".join(text.split()))[:2])[:1000],
+            "keywords": [w for w, _ in Counter(words).most_common(5)],
+            "characters": [],
+            "categories": ["General"]
+        }
+        return type("StubResponse", (), {"text": json.dumps(reply)})()
@@ -0,0 +1,82 @@
+"""Summaries memoized per (book content hash, summarizer version, source).
+
+Results live in the ``summaries`` collection, so both gunicorn workers share
+them and they survive restarts. An entry expires SUMMARY_CACHE_TTL seconds
+after it was computed; once there are more than SUMMARY_CACHE_MAX_ENTRIES the
+oldest are dropped. Bumping a source's version below, or configuring another
+GEMINI_MODEL for the model-backed sources, retires its old entries.
+"""
+
+from datetime import datetime, timedelta
+
+from config import Config
+from data_store import SUMMARIES, delete_record, get_record, insert_record, prune, update_record
+
+# Change when a summarizer's output changes (prompt or algorithm)
+VERSIONS = {
+    "gemini": "2",
+    "gemini-section": "1",
+    "local-fallback": "simple/1",
+}
+# Sources whose output also depends on Config.GEMINI_MODEL
+MODEL_SOURCES = ("gemini", "gemini-section")
+
+
+def _now():
+    return datetime.utcnow()
+
+
+def timestamp():
+    return _now().isoformat()
+
+
+def version(source):
+    if source in MODEL_SOURCES:
+        return f"{Config.GEMINI_MODEL}/{VERSIONS[source]}"
+    return VERSIONS[source]
+
+
+def _id(content_key, source):
+    return f"{content_key}:{source}:{version(source)}"
+
+
+def _expired(entry, now):
+    cutoff = (now - timedelta(seconds=Config.SUMMARY_CACHE_TTL)).isoformat()
+    return entry.get("createdAt", "") < cutoff
+
+
+def get(content_key, source, since=None):
+    """The cached result for this content and source, or None.
+
+    ``since`` (an ISO timestamp) ignores entries computed before it.
+    """
+    entry = get_record(SUMMARIES, _id(content_key, source))
+    if entry is None or (since and entry.get("createdAt", "") < since):
+        return None
+    if _expired(entry, _now()):
+        delete_record(SUMMARIES, entry["id"])
+        return None
+    return entry["result"]
+
+
+def put(content_key, source, result):
+    entry = {
+        "id": _id(content_key, source),
+        "contentKey": content_key,
+        "source": source,
+        "version": version(source),
+        "result": result,
+        "createdAt": timestamp()
+    }
+    if update_record(SUMMARIES, entry["id"], entry) is None:
+        try:
+            insert_record(SUMMARIES, entry)
+        except Exception:
+            pass  # another worker cached the same result meanwhile
+    evict()
+
+
+def evict():
+    """Drop expired entries and the oldest ones beyond the size limit."""
+    cutoff = (_now() - timedelta(seconds=Config.SUMMARY_CACHE_TTL)).isoformat()
+    prune(SUMMARIES, "createdAt", cutoff=cutoff, keep=Config.SUMMARY_CACHE_MAX_ENTRIES)
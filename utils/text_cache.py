@@ -0,0 +1,72 @@
+"""On-disk cache of extracted PDF text keyed by SHA-256 of the file bytes.
+
+Entries live in TEXT_CACHE_DIR as <sha256>.txt. A hit refreshes the file's
+mtime, and once the directory grows past TEXT_CACHE_MAX_BYTES the least
+recently used entries are deleted, so the cache stays size-bounded.
+"""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+
+from config import Config
+from data_store import atomic_write
+
+_lock = threading.Lock()
+
+
+def content_key(data):
+    """SHA-256 of bytes, or of an open binary file read from the start (and rewound)."""
+    if isinstance(data, (bytes, bytearray)):
+        return hashlib.sha256(data).hexdigest()
+    digest = hashlib.sha256()
+    data.seek(0)
+    for chunk in iter(lambda: data.read(1024 * 1024), b""):
+        digest.update(chunk)
+    data.seek(0)
+    return digest.hexdigest()
+
+
+def _path(key):
+    return Path(Config.TEXT_CACHE_DIR) / f"{key}.txt"
+
+
+def get(key):
+    path = _path(key)
+    try:
+        text = path.read_text(encoding="utf-8")
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)  # mark as recently used
+    except FileNotFoundError:
+        pass  # evicted by another worker meanwhile; the text is still valid
+    return text
+
+
+def put(key, text):
+    path = _path(key)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    atomic_write(path, text)
+    evict()
+
+
+def evict(max_bytes=None):
+    """Delete least recently used entries until the cache fits in max_bytes."""
+    max_bytes = Config.TEXT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    with _lock:
+        try:
+            with os.scandir(Config.TEXT_CACHE_DIR) as it:
+                entries = [(e.stat().st_mtime_ns, e.stat().st_size, e.path) for e in it if e.name.endswith(".txt")]
+        except FileNotFoundError:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
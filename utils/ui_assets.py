@@ -0,0 +1,326 @@
+"""Build and serve the static UI (static_ui/) as fingerprinted, precompressed assets.
+
+build() takes the scripts and stylesheets index.html links under /ui/,
+minifies them (comments and redundant whitespace only; names are left
+alone), names each file after its content hash, rewrites index.html to point
+at the new names and writes everything to static_ui/dist/ together with
+.gz (and, if the optional brotli package is installed, .br) variants. Files
+that index.html does not link, such as old backups, are not published.
+
+serve() picks the best precompressed variant for the request's
+Accept-Encoding. Hashed assets are cached by browsers as immutable;
+index.html is revalidated by ETag so a new build is picked up at once.
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+from flask import abort, request, send_file
+
+from data_store import atomic_write
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+SOURCE_DIR = Path(__file__).resolve().parent.parent / "static_ui"
+DIST_DIR = SOURCE_DIR / "dist"
+MANIFEST = DIST_DIR / "manifest.json"
+ENTRY = "index.html"
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+_asset_ref = re.compile(r'''(?<=["'])/ui/([\w.-]+\.(?:js|css))(?=["'])''')
+_html_comment = re.compile(r'<!--(?!\[).*?-->', re.S)
+
+_manifest = None
+_manifest_mtime = None
+_build_lock = threading.Lock()
+
+
+# --- Minifiers -------------------------------------------------------------
+
+_WORD = re.compile(r'[\w$\\]')
+_OPERATOR = set("+-*/%<>=!&|^~.?:")
+# After these a "/" starts a regular expression rather than a division
+_REGEX_AFTER = set("(,=:[!&|?{};+-*%<>~^")
+_REGEX_KEYWORDS = frozenset(("return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw", "yield", "await"))
+
+
+def _is_word(ch):
+    return bool(ch) and (ch >= "\x80" or bool(_WORD.match(ch)))
+
+
+def _space_needed(prev, nxt):
+    """Whether dropping the whitespace between two characters changes the tokens."""
+    return (_is_word(prev) and _is_word(nxt)) or (prev in _OPERATOR and nxt in _OPERATOR)
+
+
+def minify_js(src):
+    """
+    Strip comments and redundant whitespace from JavaScript.
+
+    Strings, template literals and regular expression literals are copied
+    verbatim. Line breaks are kept wherever automatic semicolon insertion
+    could depend on them.
+    """
+    out = []
+    i, n = 0, len(src)
+    # Each open template literal records the brace depth its ${ started at
+    templates, depth = [], 0
+    pending = None  # whitespace seen since the last token: " " or "\n"
+    previous = ""  # the last token emitted
+
+    def last():
+        return out[-1][-1] if out and out[-1] else ""
+
+    def emit(token):
+        nonlocal pending, previous
+        if pending is not None and out:
+            prev, nxt = last(), token[0]
+            if pending == "\n" and prev not in "{;,([" and nxt not in "})],;":
+                out.append("\n")
+            elif _space_needed(prev, nxt):
+                out.append(" ")
+        pending = None
+        previous = token
+        out.append(token)
+
+    def copy_template(start):
+        """From a backtick or a closing } back into template text, up to ` or ${."""
+        j = start
+        while j < n:
+            c = src[j]
+            if c == "\\":
+                j += 2
+                continue
+            if c == "`":
+                return j + 1, False
+            if c == "$" and src.startswith("${", j):
+                return j + 2, True
+            j += 1
+        return n, False
+
+    while i < n:
+        c = src[i]
+        if c in " \t\r\n\f\v":
+            j = i
+            while j < n and src[j] in " \t\r\n\f\v":
+                j += 1
+            pending = "\n" if ("\n" in src[i:j] or pending == "\n") else " "
+            i = j
+        elif src.startswith("//", i):
+            j = src.find("\n", i)
+            i = n if j < 0 else j
+        elif src.startswith("/*", i):
+            j = src.find("*/", i + 2)
+            j = n if j < 0 else j + 2
+            pending = "\n" if ("\n" in src[i:j] or pending == "\n") else (pending or " ")
+            i = j
+        elif c in "'\"":
+            j = i + 1
+            while j < n and src[j] != c:
+                j += 2 if src[j] == "\\" else 1
+            emit(src[i:j + 1])
+            i = j + 1
+        elif c == "`":
+            j, opened = copy_template(i + 1)
+            emit(src[i:j])
+            if opened:
+                templates.append(depth)
+                depth += 1
+            i = j
+        elif c == "}" and templates and depth - 1 == templates[-1]:
+            templates.pop()
+            depth -= 1
+            j, opened = copy_template(i + 1)
+            emit(src[i:j])
+            if opened:
+                templates.append(depth)
+                depth += 1
+            i = j
+        elif c == "/" and (not out or last() in _REGEX_AFTER or previous in _REGEX_KEYWORDS):
+            j, in_class = i + 1, False
+            while j < n:
+                if src[j] == "\\":
+                    j += 2
+                    continue
+                if src[j] == "[":
+                    in_class = True
+                elif src[j] == "]":
+                    in_class = False
+                elif src[j] == "/" and not in_class:
+                    break
+                elif src[j] == "\n":
+                    break
+                j += 1
+            j += 1
+            while j < n and _is_word(src[j]):
+                j += 1  # flags
+            emit(src[i:j])
+            i = j
+        else:
+            j = i + 1
+            if _is_word(c):
+                while j < n and _is_word(src[j]):
+                    j += 1
+            elif c == "{":
+                depth += 1
+            elif c == "}":
+                depth -= 1
+            emit(src[i:j])
+            i = j
+    return "".join(out) + "\n"
+
+
+_css_string_or_comment = re.compile(r'("(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\')|/\*.*?\*/', re.S)
+
+
+def minify_css(src):
+    """Strip comments and whitespace around CSS punctuation; strings are kept."""
+    parts, text = [], []
+    last = 0
+    for m in _css_string_or_comment.finditer(src):
+        text.append(src[last:m.start()])
+        if m.group(1):
+            parts.append(_squeeze_css("".join(text)))
+            parts.append(m.group(1))
+            text = []
+        last = m.end()
+    text.append(src[last:])
+    parts.append(_squeeze_css("".join(text)))
+    return "".join(parts).strip() + "\n"
+
+
+def _squeeze_css(text):
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r' ?([{};,>]) ?', r'\1', text)
+    return text.replace(";}", "}")
+
+
+# --- Build -----------------------------------------------------------------
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _source_hashes():
+    html = (SOURCE_DIR / ENTRY).read_text(encoding="utf-8")
+    names = sorted(set(_asset_ref.findall(html)))
+    hashes = {ENTRY: _digest(html.encode())}
+    for name in names:
+        hashes[name] = _digest((SOURCE_DIR / name).read_bytes())
+    return html, names, hashes
+
+
+def _write(name, data, files):
+    """Write a published file and its compressed variants."""
+    path = DIST_DIR / name
+    variants = {"identity": data, "gzip": gzip.compress(data, 9, mtime=0)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(data, quality=11)
+    encodings = []
+    for encoding, body in variants.items():
+        # Only keep a compressed variant that actually saves bytes
+        if encoding != "identity" and len(body) >= len(data):
+            continue
+        target = path if encoding == "identity" else path.with_name(path.name + (".gz" if encoding == "gzip" else ".br"))
+        tmp = target.with_name(f".{target.name}.{os.getpid()}.tmp")
+        tmp.write_bytes(body)
+        os.replace(tmp, target)
+        encodings.append(encoding)
+    files[name] = {"etag": _digest(data)[:16], "encodings": encodings, "sizes": {e: len(variants[e]) for e in encodings}}
+
+
+def build():
+    """Build static_ui/dist/ and return the manifest."""
+    with _build_lock:
+        html, names, hashes = _source_hashes()
+        DIST_DIR.mkdir(exist_ok=True)
+        assets, files = {}, {}
+        for name in names:
+            text = (SOURCE_DIR / name).read_text(encoding="utf-8")
+            minified = (minify_js(text) if name.endswith(".js") else minify_css(text)).encode()
+            stem, ext = os.path.splitext(name)
+            hashed = f"{stem}.{_digest(minified)[:10]}{ext}"
+            assets[name] = hashed
+            _write(hashed, minified, files)
+        page = _asset_ref.sub(lambda m: "/ui/" + assets[m.group(1)], _html_comment.sub("", html))
+        _write(ENTRY, page.encode(), files)
+        manifest = {"sources": hashes, "assets": assets, "files": files}
+        # Written last: readers only see a manifest whose files all exist
+        atomic_write(MANIFEST, json.dumps(manifest, indent=1))
+        _prune(files)
+        return manifest
+
+
+def _prune(files):
+    """Delete assets of earlier builds (older than an hour, for pages still open)."""
+    keep = set(files) | {MANIFEST.name}
+    for entry in os.scandir(DIST_DIR):
+        base = entry.name[:-3] if entry.name.endswith((".gz", ".br")) else entry.name
+        if base not in keep and time.time() - entry.stat().st_mtime > 3600:
+            os.unlink(entry.path)
+
+
+def ensure_built():
+    """Rebuild when the sources changed since the last build."""
+    try:
+        current = json.loads(MANIFEST.read_text())["sources"]
+    except (OSError, ValueError, KeyError):
+        current = None
+    if current != _source_hashes()[2]:
+        build()
+
+
+# --- Serving ---------------------------------------------------------------
+
+def manifest():
+    global _manifest, _manifest_mtime
+    try:
+        mtime = MANIFEST.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    if mtime != _manifest_mtime:
+        _manifest = json.loads(MANIFEST.read_text())
+        _manifest_mtime = mtime
+    return _manifest
+
+
+def serve(filename=ENTRY):
+    """Response for a built UI file, or None when there is no build."""
+    built = manifest()
+    if built is None:
+        return None
+    immutable = filename in built["files"] and filename != ENTRY
+    # Unhashed names (from a page cached before the build) get the current file
+    name = built["assets"].get(filename, filename)
+    info = built["files"].get(name)
+    if info is None:
+        # Only what the build published is served: no backups or stray files
+        abort(404)
+    accepted = request.accept_encodings
+    encoding = next((e for e in ("br", "gzip") if e in info["encodings"] and accepted[e]), "identity")
+    path = DIST_DIR / name
+    if encoding != "identity":
+        path = path.with_name(path.name + (".gz" if encoding == "gzip" else ".br"))
+    mimetype = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=f"{info['etag']}-{encoding}")
+    if encoding != "identity":
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    if immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response